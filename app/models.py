@@ -19,6 +19,11 @@ class User(UserMixin, db.Model):
     is_approved = db.Column(db.Boolean, default=False, nullable=False)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     
+    # Partial index over pending users only (PostgreSQL)
+    __table_args__ = (
+        db.Index('ix_users_pending', 'id', postgresql_where=db.text('is_approved = false')),
+    )
+    
     # Relationships
     anaf_token = relationship('AnafToken', back_populates='user', uselist=False)
     companies = relationship('Company', back_populates='user', cascade='all, delete-orphan')
@@ -364,6 +364,8 @@ def disconnect():
         if token:
             db.session.delete(token)
             db.session.commit()
+            # Workers must not keep sending the cached token after a disconnect
+            ANAFService.invalidate_token(current_user.id)
             current_app.logger.info(f"User {current_user.id} disconnected ANAF account (token deleted)")
             flash('ANAF account disconnected. You will need to re-authenticate to sync invoices.', 'success')
         else:
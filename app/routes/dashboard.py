@@ -8,6 +8,7 @@ from sqlalchemy import desc, asc, func
 from datetime import datetime, timezone
 import zipfile
 import io
+import tempfile
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
@@ -210,20 +211,29 @@ def download_invoice(invoice_id):
     safe_filename = f"invoice_{invoice.anaf_id}.zip".replace('/', '_').replace('\\', '_')
     
     # Tier 1: Try to re-download from ANAF API (fresh data)
+    # The download is streamed into a spooled temp file (in memory up to 1 MB,
+    # on disk beyond) instead of being buffered whole
+    zip_file = tempfile.SpooledTemporaryFile(max_size=1 << 20)
     try:
         anaf_service = ANAFService(current_user.id)
-        zip_content = anaf_service.descarcare_factura(invoice.anaf_id)
+        anaf_service.descarcare_factura(invoice.anaf_id, sink=zip_file)
+        # The sink is positioned at the end of the download: that is its size
+        zip_size = zip_file.tell()
+        zip_file.seek(0)
         
         # Return ZIP file
-        return Response(
-            zip_content,
+        response = send_file(
+            zip_file,
             mimetype='application/zip',
-            headers={
-                'Content-Disposition': f'attachment; filename={safe_filename}',
-                'X-Content-Type-Options': 'nosniff'
-            }
+            as_attachment=True,
+            download_name=safe_filename
         )
+        # send_file can't size a file object on its own
+        response.content_length = zip_size
+        response.headers['X-Content-Type-Options'] = 'nosniff'
+        return response
     except Exception as e:
+        zip_file.close()
         current_app.logger.debug(f"ANAF API download failed for invoice {invoice.anaf_id}: {str(e)}")
         pass
     
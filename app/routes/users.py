@@ -1,34 +1,63 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session, abort, g
 from flask_login import login_required, current_user, login_user
 from flask import current_app
+from sqlalchemy import update, delete
+from sqlalchemy.orm import load_only
 from app.models import db, User
 from app.utils.decorators import admin_required
-from app.utils.impersonation import is_impersonating, get_original_admin
+from app.utils.impersonation import is_impersonating, get_original_admin, get_acting_admin
 from datetime import datetime
 
 users_bp = Blueprint('users', __name__)
 
+
+@users_bp.before_request
+def load_original_admin():
+    """Resolve the acting admin once per request and reject non-admins
+    
+    When impersonating, admin rights come from the original admin, so the
+    user management pages stay reachable. stop_impersonate is exempt: it must
+    work for impersonated sessions whose original admin can no longer be loaded.
+    """
+    if not current_user.is_authenticated or request.endpoint == 'users.stop_impersonate':
+        # Leave unauthenticated requests to login_required
+        return None
+    
+    g.original_admin = get_acting_admin()
+    if not g.original_admin or not g.original_admin.is_admin:
+        flash('You do not have permission to access this page.', 'error')
+        return redirect(url_for('dashboard.index'))
+    return None
+
+
+def _wants_json():
+    """True when the admin page submitted the action via fetch() and will patch the row itself"""
+    return (
+        request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+        or request.accept_mimetypes.best == 'application/json'
+    )
+
+
 @users_bp.route('/users')
 @login_required
 def index():
     """User management page for admins"""
-    # Check if user is admin (either directly or as original admin when impersonating)
-    original_admin = get_original_admin() if is_impersonating() else current_user
-    if not original_admin or not original_admin.is_admin:
-        flash('You do not have permission to access this page.', 'error')
-        return redirect(url_for('dashboard.index'))
+    page = request.args.get('page', 1, type=int)
+    per_page = 100
     
-    # Get all users
-    users = User.query.order_by(User.created_at.desc()).all()
+    # One page of users - only the columns rendered by the template
+    users = User.query.options(
+        load_only(User.id, User.email, User.is_admin, User.is_approved, User.created_at)
+    ).order_by(User.created_at.desc()).paginate(page=page, per_page=per_page, error_out=False)
     
-    # Count pending approvals
+    # Pending approvals across all pages (served by the ix_users_pending partial index)
     pending_count = User.query.filter_by(is_approved=False).count()
     
     return render_template(
         'users/index.html',
         users=users,
         pending_count=pending_count,
-        original_admin=original_admin
+        original_admin=g.original_admin
     )
 
 @users_bp.route('/users/approve/<int:user_id>', methods=['POST'])
@@ -36,15 +65,30 @@ def index():
 @admin_required
 def approve_user(user_id):
     """Approve a user"""
-    user = User.query.get_or_404(user_id)
+    # Single UPDATE ... RETURNING: the "not yet approved" check is part of the WHERE clause
+    result = db.session.execute(
+        update(User)
+        .where(User.id == user_id, User.is_approved.is_(False))
+        .values(is_approved=True)
+        .returning(User.email)
+    ).first()
     
-    if user.is_approved:
-        flash(f'User {user.email} is already approved.', 'info')
+    changed = result is not None
+    if not changed:
+        # Nothing updated - either the user doesn't exist or is already approved
+        user = User.query.get_or_404(user_id)
+        message = f'User {user.email} is already approved.'
+        category = 'info'
     else:
-        user.is_approved = True
         db.session.commit()
-        flash(f'User {user.email} has been approved successfully.', 'success')
+        message = f'User {result.email} has been approved successfully.'
+        category = 'success'
     
+    if _wants_json():
+        # `changed` is false for users that were already approved (stale row, double click)
+        return jsonify({'id': user_id, 'is_approved': True, 'changed': changed, 'message': message})
+    
+    flash(message, category)
     return redirect(url_for('users.index'))
 
 @users_bp.route('/users/reject/<int:user_id>', methods=['POST'])
@@ -52,23 +96,49 @@ def approve_user(user_id):
 @admin_required
 def reject_user(user_id):
     """Reject/Delete a user registration"""
-    user = User.query.get_or_404(user_id)
-    
     # Prevent deleting yourself
-    if user.id == current_user.id:
+    if user_id == current_user.id:
+        if _wants_json():
+            return jsonify({'error': 'You cannot delete your own account.'}), 400
         flash('You cannot delete your own account.', 'error')
         return redirect(url_for('users.index'))
     
-    # Prevent deleting other admins
-    if user.is_admin:
-        flash('You cannot delete admin accounts.', 'error')
-        return redirect(url_for('users.index'))
+    # Single DELETE ... RETURNING with the admin guard folded into the WHERE clause.
+    # Users owning companies or an ANAF token are left to the ORM path below so
+    # relationship cascades still apply.
+    result = db.session.execute(
+        delete(User)
+        .where(
+            User.id == user_id,
+            User.is_admin.is_(False),
+            ~User.companies.any(),
+            ~User.anaf_token.has()
+        )
+        .returning(User.email)
+    ).first()
+    
+    if result is not None:
+        email = result.email
+    else:
+        user = User.query.get_or_404(user_id)
+        
+        # Prevent deleting other admins
+        if user.is_admin:
+            if _wants_json():
+                return jsonify({'error': 'You cannot delete admin accounts.'}), 400
+            flash('You cannot delete admin accounts.', 'error')
+            return redirect(url_for('users.index'))
+        
+        email = user.email
+        db.session.delete(user)
     
-    email = user.email
-    db.session.delete(user)
     db.session.commit()
-    flash(f'User {email} has been rejected and removed.', 'success')
+    message = f'User {email} has been rejected and removed.'
+    
+    if _wants_json():
+        return jsonify({'id': user_id, 'deleted': True, 'message': message})
     
+    flash(message, 'success')
     return redirect(url_for('users.index'))
 
 @users_bp.route('/users/toggle-admin/<int:user_id>', methods=['POST'])
@@ -76,19 +146,102 @@ def reject_user(user_id):
 @admin_required
 def toggle_admin(user_id):
     """Toggle admin status of a user"""
-    user = User.query.get_or_404(user_id)
-    
     # Prevent removing admin from yourself
-    if user.id == current_user.id:
+    if user_id == current_user.id:
+        if _wants_json():
+            return jsonify({'error': 'You cannot remove admin privileges from yourself.'}), 400
         flash('You cannot remove admin privileges from yourself.', 'error')
         return redirect(url_for('users.index'))
     
-    user.is_admin = not user.is_admin
+    # Single UPDATE ... RETURNING flips the flag and reports the new state
+    result = db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(is_admin=~User.is_admin)
+        .returning(User.email, User.is_admin)
+    ).first()
+    
+    if result is None:
+        abort(404)
+    
     db.session.commit()
     
-    status = 'granted' if user.is_admin else 'revoked'
-    flash(f'Admin privileges {status} for {user.email}.', 'success')
+    status = 'granted' if result.is_admin else 'revoked'
+    message = f'Admin privileges {status} for {result.email}.'
     
+    if _wants_json():
+        return jsonify({'id': user_id, 'is_admin': result.is_admin, 'message': message})
+    
+    flash(message, 'success')
+    return redirect(url_for('users.index'))
+
+
+def _selected_user_ids():
+    """Parse the user_ids list submitted by the bulk action form"""
+    user_ids = set()
+    for raw_id in request.form.getlist('user_ids'):
+        try:
+            user_ids.add(int(raw_id))
+        except (ValueError, TypeError):
+            continue
+    return user_ids
+
+
+@users_bp.route('/users/bulk-approve', methods=['POST'])
+@login_required
+@admin_required
+def bulk_approve():
+    """Approve several pending users with a single UPDATE"""
+    user_ids = _selected_user_ids()
+    if not user_ids:
+        flash('No users selected.', 'warning')
+        return redirect(url_for('users.index'))
+    
+    result = db.session.execute(
+        update(User)
+        .where(User.id.in_(user_ids), User.is_approved.is_(False))
+        .values(is_approved=True)
+    )
+    db.session.commit()
+    
+    flash(f'{result.rowcount} user(s) have been approved successfully.', 'success')
+    return redirect(url_for('users.index'))
+
+
+@users_bp.route('/users/bulk-reject', methods=['POST'])
+@login_required
+@admin_required
+def bulk_reject():
+    """Reject/Delete several user registrations with a single DELETE"""
+    user_ids = _selected_user_ids()
+    # Never delete yourself
+    user_ids.discard(current_user.id)
+    if not user_ids:
+        flash('No users selected.', 'warning')
+        return redirect(url_for('users.index'))
+    
+    # Same guards as reject_user; users with dependent rows go through the ORM below
+    deleted_ids = db.session.execute(
+        delete(User)
+        .where(
+            User.id.in_(user_ids),
+            User.is_admin.is_(False),
+            ~User.companies.any(),
+            ~User.anaf_token.has()
+        )
+        .returning(User.id)
+    ).scalars().all()
+    removed_count = len(deleted_ids)
+    
+    remaining_ids = user_ids.difference(deleted_ids)
+    if remaining_ids:
+        for user in User.query.filter(User.id.in_(remaining_ids), User.is_admin.is_(False)).all():
+            db.session.delete(user)
+            removed_count += 1
+    
+    db.session.commit()
+    
+    flash(f'{removed_count} user(s) have been rejected and removed.', 'success')
     return redirect(url_for('users.index'))
 
 
@@ -96,13 +249,8 @@ def toggle_admin(user_id):
 @login_required
 def impersonate_user(user_id):
     """Start impersonating a user"""
-    # Get the actual admin user (not the impersonated one if already impersonating)
-    original_admin = get_original_admin() if is_impersonating() else current_user
-    
-    # Verify the original admin is actually an admin
-    if not original_admin or not original_admin.is_admin:
-        flash('You do not have permission to impersonate users.', 'error')
-        return redirect(url_for('dashboard.index'))
+    # The actual admin user (not the impersonated one if already impersonating)
+    original_admin = g.original_admin
     
     # Get target user
     target_user = User.query.get_or_404(user_id)
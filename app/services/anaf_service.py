@@ -1,32 +1,162 @@
 import requests
 import ssl
 import json
-from datetime import datetime, timedelta, timezone
+import re
+import logging
+import time
+import base64
+import threading
+import http.cookiejar
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from urllib3.util.ssl_ import create_urllib3_context
 from flask import current_app
 from app.services.oauth_service import OAuthService
 
+# orjson parses response bytes directly and is several times faster than the
+# stdlib on large listings; fall back to json (which also accepts bytes)
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# SSL context with standard settings for api.anaf.ro (OAuth2 endpoint), built once
+# per process - parsing the cipher string and allocating OpenSSL state is not free
+_ANAF_SSL_CTX = create_urllib3_context()
+
+# SECLEVEL=1 for compatibility with government servers
+_ANAF_SSL_CTX.set_ciphers('DEFAULT@SECLEVEL=1')
+
+# TLS 1.2+ is standard and secure. No maximum is set and TLS 1.3 is explicitly
+# allowed, so the 1-RTT handshake is used wherever ANAF supports it.
+_ANAF_SSL_CTX.minimum_version = ssl.TLSVersion.TLSv1_2
+_ANAF_SSL_CTX.options &= ~ssl.OP_NO_TLSv1_3
+
+# Advertise HTTP/1.1 via ALPN (the only protocol requests/urllib3 speak)
+_ANAF_SSL_CTX.set_alpn_protocols(['http/1.1'])
+
+
 class TLSAdapter(HTTPAdapter):
     """Custom TLS adapter for ANAF api.anaf.ro compatibility"""
     
     def init_poolmanager(self, *args, **kwargs):
-        # Create SSL context with standard settings for api.anaf.ro (OAuth2 endpoint)
-        context = create_urllib3_context()
-        
-        # SECLEVEL=1 for compatibility with government servers
-        context.set_ciphers('DEFAULT@SECLEVEL=1')
-        
-        # TLS 1.2+ is standard and secure
-        context.minimum_version = ssl.TLSVersion.TLSv1_2
-        
-        kwargs['ssl_context'] = context
+        kwargs['ssl_context'] = _ANAF_SSL_CTX
         return super().init_poolmanager(*args, **kwargs)
+    
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        # Connections through an HTTPS proxy use the same shared context
+        proxy_kwargs['ssl_context'] = _ANAF_SSL_CTX
+        return super().proxy_manager_for(proxy, **proxy_kwargs)
+
+
+# ANAF listing errors that are normal end conditions rather than failures, e.g.
+# "Pagina solicitata X este mai mare decat numarul toatal de pagini Y" (sic)
+_END_OF_PAGES_RE = re.compile(r'mai mare decat numarul toa?tal de pagini', re.IGNORECASE)
+_NO_MESSAGES_RE = re.compile(r'nu exista mesaje|no messages', re.IGNORECASE)
+
+# Keys under which a listing payload may be wrapped, in lookup order
+_WRAPPER_KEYS = ('data', 'result', 'response')
+
+# CIF/CUI as sent to ANAF: ASCII digits only
+_CIF_RE = re.compile(r'\A[0-9]+\Z')
+
+
+def _wrapper_key(response_data):
+    """Return the key a listing payload is wrapped under, or None if it isn't wrapped"""
+    if isinstance(response_data, dict):
+        for key in _WRAPPER_KEYS:
+            if isinstance(response_data.get(key), dict):
+                return key
+    return None
+
+
+def _jwt_expiry(token):
+    """Return the `exp` claim (unix seconds) of a JWT access token, or None"""
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get('exp')
+        return float(exp) if exp is not None else None
+    except (IndexError, ValueError, TypeError, AttributeError):
+        return None
+
+
+# Shared session for all ANAFService instances so keep-alive connections (and the
+# TLS handshakes behind them) are reused across users and requests. Created on first
+# use so the pool size can come from the app config.
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+
+def _get_session():
+    """Return the process-wide ANAF session, creating it on first use"""
+    global _SESSION
+    if _SESSION is None:
+        with _SESSION_LOCK:
+            if _SESSION is None:
+                session = requests.Session()
+                # The session is shared by all users: never store cookies (e.g. load
+                # balancer or session cookies set by api.anaf.ro) that would then be
+                # sent with other users' requests
+                session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+                session.headers.update({
+                    'Content-Type': 'application/json',
+                    'Accept': 'application/json'
+                })
+                session.mount('https://', TLSAdapter(
+                    pool_connections=4,
+                    pool_maxsize=current_app.config.get('ANAF_POOL_MAXSIZE', 32),
+                    # Wait for a free keep-alive connection instead of opening (and then
+                    # discarding) extra ones when more threads than pool slots are busy
+                    pool_block=True,
+                    # Retry budget with exponential backoff: transient TLS/connect errors, rate
+                    # limiting and server errors are retried here instead of by callers hammering the API
+                    max_retries=Retry(
+                        total=5,
+                        connect=3,
+                        read=0,  # Never replay a request the server may already be processing
+                        backoff_factor=0.5,
+                        # Rate limiting (429) and transient server errors no longer abort a whole scan
+                        status_forcelist=[429, 500, 502, 503, 504],
+                        allowed_methods=frozenset(['GET']),
+                        respect_retry_after_header=True,
+                        raise_on_status=False  # Let response.raise_for_status() report the final status
+                    )
+                ))
+                _SESSION = session
+    return _SESSION
 
 
 class ANAFService:
     """Service for interacting with ANAF API"""
     
+    # Endpoint paths, joined with base_url once per instance
+    _PATH_LISTA = '/prod/FCTEL/rest/listaMesajePaginatieFactura'
+    _PATH_DESCARCARE = '/prod/FCTEL/rest/descarcare'
+    _PATH_COMPANIES = '/api/user/companies'
+    
+    # Access tokens shared by all instances:
+    # {user_id: (token, monotonic reuse deadline, headers, download headers)}
+    _token_cache = {}
+    _token_cache_lock = threading.Lock()
+    
+    # Per-user locks serializing token loads: when several workers miss the cache
+    # (or all get a 401 at once) only one of them refreshes, the rest reuse its entry
+    _token_load_locks = {}
+    
+    # Safety limit on listing pages to prevent runaway pagination
+    _MAX_PAGES = 1000
+    
+    # Refetch this many seconds before expiry (matches OAuthService's refresh window)
+    _TOKEN_EXPIRY_MARGIN = 300
+    
+    # Re-read the token from the database at least this often, so a refresh or
+    # disconnect done by another process is picked up without a query per call
+    _TOKEN_CACHE_TTL = 60
+    
     def __init__(self, user_id):
         self.user_id = user_id
         self.oauth_service = OAuthService(user_id)
@@ -34,34 +164,138 @@ class ANAFService:
         # webserviceapl.anaf.ro is for direct certificate authentication (mTLS)
         # Documentation: https://mfinante.gov.ro/static/10/eFactura/prezentare%20api%20efactura.pdf
         self.base_url = current_app.config.get('ANAF_API_BASE_URL', 'https://api.anaf.ro')
+        self._url_lista = self.base_url + self._PATH_LISTA
+        self._url_descarcare = self.base_url + self._PATH_DESCARCARE
+        self._url_companies = self.base_url + self._PATH_COMPANIES
         
-        # Create session with custom TLS adapter for ANAF compatibility
-        self.session = requests.Session()
-        self.session.mount('https://', TLSAdapter())
+        # Module-level session with custom TLS adapter for ANAF compatibility
+        self.session = _get_session()
     
     def _get_headers(self):
-        """Get headers with authorization token"""
-        import sys
-        print(f"[ANAF_SERVICE] _get_headers called for user_id={self.user_id}", file=sys.stderr)
-        sys.stderr.flush()
+        """Get headers with authorization token
         
-        access_token = self.oauth_service.get_valid_token()
+        The dict is cached with the token and shared between calls - copy it
+        before adding keys.
+        """
+        # Static headers live on the shared session; only the per-user token is
+        # sent per call (never put it on the session, which is shared by all users)
+        return self._get_auth_entry()[2]
+    
+    def _get_download_headers(self):
+        """Get authorization headers with Accept overridden for binary content (shared, don't mutate)"""
+        return self._get_auth_entry()[3]
+    
+    def _get_access_token(self):
+        """Get the access token, reusing the cached one until shortly before it expires"""
+        return self._get_auth_entry()[0]
+    
+    def _get_auth_entry(self):
+        """
+        Get (token, monotonic reuse deadline, headers, download headers) for this user
         
-        # Log token info for debugging
-        print(f"[ANAF_SERVICE] Got access token (length: {len(access_token) if access_token else 0}) for user_id={self.user_id}", file=sys.stderr)
-        sys.stderr.flush()
+        The header dicts are built once per token, so repeated calls (e.g. thousands
+        of downloads in a sync) don't re-format the Bearer string. They live in the
+        same cache entry as the token and are dropped and rebuilt together with it.
+        """
+        with self._token_cache_lock:
+            cached = self._token_cache.get(self.user_id)
+        if cached and time.monotonic() < cached[1]:
+            return cached
+        
+        with self._token_load_lock(self.user_id):
+            # Another worker may have loaded the token while this one waited
+            with self._token_cache_lock:
+                cached = self._token_cache.get(self.user_id)
+            if cached and time.monotonic() < cached[1]:
+                return cached
+            return self._load_auth_entry()
+    
+    def _load_auth_entry(self):
+        """Fetch a valid token from OAuthService and cache its auth entry (caller holds the load lock)"""
+        access_token = self.oauth_service.get_valid_token()
         
-        current_app.logger.info(f"Using access token for API request (user_id={self.user_id}, length: {len(access_token) if access_token else 0})")
-        if access_token:
-            current_app.logger.info(f"Token preview: {access_token[:20]}...{access_token[-20:]}")
-        else:
+        if not access_token:
             current_app.logger.error("No access token available!")
+        elif current_app.logger.isEnabledFor(logging.DEBUG):
+            current_app.logger.debug(
+                "Using access token for API request (user_id=%s, length: %s, preview: %s...%s)",
+                self.user_id, len(access_token), access_token[:20], access_token[-20:]
+            )
         
-        return {
-            'Authorization': f'Bearer {access_token}',
-            'Content-Type': 'application/json',
-            'Accept': 'application/json'
-        }
+        headers = {'Authorization': f'Bearer {access_token}'}
+        download_headers = {**headers, 'Accept': 'application/octet-stream'}
+        
+        # Cache until shortly before the JWT `exp` claim (converted to the monotonic
+        # clock), but no longer than the TTL: the cache is per process, and another
+        # worker may have refreshed or deleted the stored token in the meantime
+        exp = _jwt_expiry(access_token) if access_token else None
+        if exp is None:
+            return (access_token, None, headers, download_headers)
+        
+        now = time.monotonic()
+        deadline = min(now + (exp - time.time()) - self._TOKEN_EXPIRY_MARGIN, now + self._TOKEN_CACHE_TTL)
+        entry = (access_token, deadline, headers, download_headers)
+        with self._token_cache_lock:
+            self._token_cache[self.user_id] = entry
+        return entry
+    
+    @classmethod
+    def _token_load_lock(cls, user_id):
+        """Get the lock serializing token loads for user_id (reentrant: reloads go through _get_auth_entry)"""
+        with cls._token_cache_lock:
+            lock = cls._token_load_locks.get(user_id)
+            if lock is None:
+                lock = cls._token_load_locks[user_id] = threading.RLock()
+            return lock
+    
+    def _reload_headers(self, rejected_authorization):
+        """Get headers with a fresh token after ANAF rejected rejected_authorization (HTTP 401)"""
+        with self._token_load_lock(self.user_id):
+            with self._token_cache_lock:
+                entry = self._token_cache.get(self.user_id)
+                # Only drop the rejected token: a worker that got its 401 earlier may
+                # already have replaced it, and that entry is reused as is
+                if entry is not None and entry[2]['Authorization'] == rejected_authorization:
+                    del self._token_cache[self.user_id]
+            return self._get_headers()
+    
+    @classmethod
+    def invalidate_token(cls, user_id):
+        """
+        Forget the cached access token of a user
+        
+        Call after the stored token changed (disconnect, new OAuth login, refresh)
+        so this process stops sending the old one.
+        """
+        with cls._token_cache_lock:
+            cls._token_cache.pop(user_id, None)
+    
+    def _invalidate_token(self, error):
+        """Drop the cached access token when ANAF rejected it (HTTP 401)"""
+        response = getattr(error, 'response', None)
+        if response is not None and response.status_code == 401:
+            self.invalidate_token(self.user_id)
+    
+    def _authorized_get(self, url, headers, **kwargs):
+        """
+        GET with the cached access token, retrying once with a fresh token on HTTP 401
+        
+        The cached token may be stale when another worker process refreshed it in
+        the database, so a 401 drops the cache entry and reloads it before giving up
+        (once per rejected token, however many workers got the 401).
+        Headers resolved before the entry was invalidated and rebuilt (e.g. by a
+        long batch) are swapped for the current ones instead of being sent stale.
+        """
+        with self._token_cache_lock:
+            entry = self._token_cache.get(self.user_id)
+        if entry is not None and headers.get('Authorization') != entry[2]['Authorization']:
+            headers = {**headers, **entry[2]}
+        response = self.session.get(url, headers=headers, **kwargs)
+        if response.status_code == 401:
+            response.close()
+            headers = {**headers, **self._reload_headers(headers.get('Authorization'))}
+            response = self.session.get(url, headers=headers, **kwargs)
+        return response
     
     def lista_mesaje_factura(self, cif, zile=60):
         """
@@ -82,28 +316,12 @@ class ANAFService:
         Returns:
             Dictionary with structure: {"mesaje": [...], "serial": "", "cui": "", "titlu": ""}
         """
-        # Validate zile parameter (1-90 per ANAF limits for paginated endpoint)
-        if not isinstance(zile, int) or zile < 1 or zile > 90:
-            raise ValueError(f"zile must be an integer between 1 and 90, got {zile}")
-        
-        # Validate cif parameter (should be string with digits only)
-        if not isinstance(cif, str) or not cif.isdigit():
-            raise ValueError(f"cif must be a string containing only digits, got {cif}")
-        
-        # Log request details with user_id for verification
-        import sys
-        print(f"[ANAF_API] REQUEST: lista_mesaje_factura - user_id={self.user_id}, cif={cif}, zile={zile}", file=sys.stderr)
-        sys.stderr.flush()
-        
-        current_app.logger.info(f"=== ANAF API REQUEST: Lista Mesaje Factura (using paginated endpoint) ===")
-        current_app.logger.info(f"User ID: {self.user_id}")
-        current_app.logger.info(f"CIF: {cif}")
-        current_app.logger.info(f"Zile: {zile}")
+        self._validate_cif_zile(cif, zile)
         
         # Use the paginated endpoint directly to handle all cases (including > 500 invoices)
-        return self.lista_mesaje_factura_paginated(cif, zile)
+        return self._lista_mesaje_paginated(cif, zile)
     
-    def lista_mesaje_factura_paginated(self, cif, zile=60, filter_type=None):
+    def lista_mesaje_factura_paginated(self, cif, zile=60, filter_type=None, max_workers=8):
         """
         List e-Factura message notifications for a specific CIF with pagination support.
         Automatically fetches all pages and combines results.
@@ -117,161 +335,263 @@ class ANAFService:
             cif: Company CIF/CUI (string, digits only)
             zile: Number of days to look back (integer, 1-90, default 60)
             filter_type: Optional filter for message type (E, T, P, R)
+            max_workers: Maximum number of pages fetched concurrently after page 1 (default 8)
         
         Returns:
             Dictionary with structure: {"mesaje": [...], "serial": "", "cui": "", "titlu": ""}
             with all messages from all pages combined
         """
-        # Validate parameters
-        if not isinstance(zile, int) or zile < 1 or zile > 90:
-            raise ValueError(f"zile must be an integer between 1 and 90, got {zile}")
-        
-        if not isinstance(cif, str) or not cif.isdigit():
-            raise ValueError(f"cif must be a string containing only digits, got {cif}")
+        self._validate_cif_zile(cif, zile)
         
         if filter_type and filter_type not in ['E', 'T', 'P', 'R']:
             raise ValueError(f"filter_type must be one of: E, T, P, R, got {filter_type}")
         
+        return self._lista_mesaje_paginated(cif, zile, filter_type, max_workers)
+    
+    @staticmethod
+    def _validate_cif_zile(cif, zile):
+        """Validate the CIF and look-back window of a listing request"""
+        # zile: 1-90 per ANAF limits for paginated endpoint
+        if not isinstance(zile, int) or zile < 1 or zile > 90:
+            raise ValueError(f"zile must be an integer between 1 and 90, got {zile}")
+        
+        # cif: string with digits only
+        if not isinstance(cif, str) or not _CIF_RE.match(cif):
+            raise ValueError(f"cif must be a string containing only digits, got {cif}")
+    
+    def _lista_mesaje_paginated(self, cif, zile, filter_type=None, max_workers=8):
+        """Fetch and combine all listing pages for already validated parameters"""
         # Calculate timestamps in milliseconds (unix timestamp)
         # endTime = now, startTime = now - zile days
-        now = datetime.now(timezone.utc)
-        end_time_ms = int(now.timestamp() * 1000)
-        start_time_ms = int((now - timedelta(days=zile)).timestamp() * 1000)
-        
-        url = f"{self.base_url}/prod/FCTEL/rest/listaMesajePaginatieFactura"
-        headers = self._get_headers()
+        end_time_ms = time.time_ns() // 1_000_000
+        start_time_ms = end_time_ms - zile * 86_400_000
         
-        all_mesaje = []
-        combined_serial = ''
-        combined_cui = ''
-        combined_titlu = ''
-        pagina = 1  # Start from page 1
-        pages_fetched = 0  # Track number of pages successfully fetched
+        params = {
+            'startTime': start_time_ms,
+            'endTime': end_time_ms,
+            'cif': cif
+        }
         
-        current_app.logger.info(f"=== ANAF API REQUEST: Lista Mesaje Factura (Paginated) ===")
-        current_app.logger.info(f"CIF: {cif}, Zile: {zile}, StartTime: {start_time_ms}, EndTime: {end_time_ms}")
+        # Add optional filter parameter
         if filter_type:
-            current_app.logger.info(f"Filter: {filter_type}")
+            params['filter'] = filter_type
+        
+        headers = self._get_headers()
+        app = current_app._get_current_object()
+        logger = current_app.logger
+        
+        wrapper_key = None
+        
+        def fetch(pagina):
+            # Also runs in worker threads, which need their own app context for logging
+            with app.app_context():
+                response_data = self._fetch_lista_page(params, pagina, headers)
+            # Handle response wrapping (shape probed once on page 1)
+            if wrapper_key is not None and isinstance(response_data, dict):
+                inner = response_data.get(wrapper_key)
+                if isinstance(inner, dict):
+                    return inner
+            return response_data
         
         try:
-            while True:
-                # Prepare paginated request parameters
-                params = {
-                    'startTime': start_time_ms,
-                    'endTime': end_time_ms,
-                    'cif': cif,
-                    'pagina': pagina
-                }
-                
-                # Add optional filter parameter
-                if filter_type:
-                    params['filter'] = filter_type
-                
-                current_app.logger.info(f"Fetching page {pagina}...")
-                
-                # Log full request URL for debugging
-                param_str = '&'.join([f"{k}={v}" for k, v in params.items()])
-                full_url = f"{url}?{param_str}"
-                current_app.logger.info(f"Paginated request URL: {full_url}")
-                
-                response = self.session.get(
-                    url,
-                    params=params,
-                    headers=headers,
-                    timeout=30
-                )
-                
-                current_app.logger.info(f"Paginated response status: {response.status_code}")
-                
-                response.raise_for_status()
-                response_data = response.json()
-                
-                # Log response structure for debugging
-                if isinstance(response_data, dict):
-                    current_app.logger.info(f"Paginated response keys: {list(response_data.keys())}")
-                
-                # Handle response wrapping
-                if isinstance(response_data, dict):
-                    if 'data' in response_data and isinstance(response_data['data'], dict):
-                        response_data = response_data['data']
-                    elif 'result' in response_data and isinstance(response_data['result'], dict):
-                        response_data = response_data['result']
-                    elif 'response' in response_data and isinstance(response_data['response'], dict):
-                        response_data = response_data['response']
-                
-                # Check for errors
-                if 'eroare' in response_data:
-                    error_msg = response_data['eroare']
-                    # Check if error indicates we've exceeded the total number of pages
-                    # Error message: "Pagina solicitata X este mai mare decat numarul toatal de pagini Y"
-                    if 'mai mare decat numarul toatal de pagini' in error_msg.lower() or 'mai mare decat numarul total de pagini' in error_msg.lower():
-                        # This is a normal end-of-pagination condition, not a real error
-                        current_app.logger.info(f"Reached end of pagination: {error_msg}")
-                        break
-                    elif 'nu exista mesaje' in error_msg.lower() or 'no messages' in error_msg.lower():
-                        # No messages in the selected interval - this is normal, not an error
-                        current_app.logger.info(f"No messages found in selected interval: {error_msg}")
-                        # Return empty result structure
-                        return {
-                            'mesaje': [],
-                            'serial': '',
-                            'cui': cif,
-                            'titlu': response_data.get('titlu', '')
-                        }
-                    else:
-                        # This is a real error, raise it
-                        current_app.logger.error(f"ANAF API error on page {pagina}: {error_msg}")
-                        raise ValueError(f"ANAF API error: {error_msg}")
-                
-                # Extract messages from current page
-                page_mesaje = response_data.get('mesaje', [])
-                
-                # Increment pages_fetched since we successfully fetched this page
-                pages_fetched += 1
-                
-                if not page_mesaje:
-                    # No more messages, stop pagination
-                    current_app.logger.info(f"No more messages on page {pagina}, stopping pagination")
-                    break
-                
-                # Combine messages
-                all_mesaje.extend(page_mesaje)
-                
-                # Store metadata from first page (they should be consistent)
-                if pagina == 1:
-                    combined_serial = response_data.get('serial', '')
-                    combined_cui = response_data.get('cui', cif)
-                    combined_titlu = response_data.get('titlu', '')
-                
-                current_app.logger.info(f"Page {pagina}: Found {len(page_mesaje)} messages (total so far: {len(all_mesaje)})")
-                
-                # Move to next page
-                pagina += 1
-                
-                # Safety limit to prevent infinite loops
-                if pagina > 1000:  # Max pages
-                    current_app.logger.warning(f"Reached maximum page limit (1000), stopping pagination")
-                    break
+            # Page 1 on its own: it carries the metadata and most listings fit in it
+            first_page = fetch(1)
+            wrapper_key = _wrapper_key(first_page)
+            if wrapper_key is not None:
+                first_page = first_page[wrapper_key]
+            first_mesaje = self._lista_page_mesaje(first_page, 1)
+            
+            # Messages are collected per page and concatenated once at the end
+            page_buckets = [first_mesaje] if first_mesaje else []
+            
+            total_pages = self._lista_total_pages(first_page)
+            if first_mesaje and total_pages is not None:
+                # ANAF reports the page count (directly or via the record count):
+                # fetch exactly pages 2..N concurrently, no probing past the last page
+                if total_pages > self._MAX_PAGES:
+                    logger.warning("Reached maximum page limit (%d), stopping pagination", self._MAX_PAGES)
+                pages = range(2, min(total_pages, self._MAX_PAGES) + 1)
+                if pages:
+                    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                        futures = [executor.submit(fetch, page_num) for page_num in pages]
+                        try:
+                            for page_num, future in zip(pages, futures):
+                                page_mesaje = self._lista_page_mesaje(future.result(), page_num)
+                                if not page_mesaje:
+                                    break
+                                page_buckets.append(page_mesaje)
+                        finally:
+                            # An empty or failed page ends the listing: don't fetch the
+                            # pages still queued behind it
+                            for future in futures:
+                                future.cancel()
+            elif first_mesaje:
+                # No page count in the response: fetch the remaining pages concurrently
+                # in waves that start at a single page and double up to max_workers, so
+                # short listings don't fire requests for pages that don't exist. Results
+                # are consumed in page order and the first empty page ends the listing.
+                pagina = 2
+                wave_size = 1
+                more_pages = True
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    while more_pages:
+                        if pagina > self._MAX_PAGES:
+                            logger.warning("Reached maximum page limit (%d), stopping pagination", self._MAX_PAGES)
+                            break
+                        
+                        wave = range(pagina, min(pagina + wave_size, self._MAX_PAGES + 1))
+                        for page_num, page_data in zip(wave, executor.map(fetch, wave)):
+                            page_mesaje = self._lista_page_mesaje(page_data, page_num)
+                            if not page_mesaje:
+                                more_pages = False
+                                break
+                            page_buckets.append(page_mesaje)
+                        
+                        pagina += len(wave)
+                        wave_size = min(wave_size * 2, max_workers)
+            
+            all_mesaje = list(chain.from_iterable(page_buckets))
             
-            current_app.logger.info(f"Pagination complete: Total messages fetched: {len(all_mesaje)} from {pages_fetched} page(s)")
-            current_app.logger.info("=" * 60)
+            # One summary record per listing instead of one per page
+            logger.info(
+                "ANAF listaMesajePaginatieFactura user_id=%s cif=%s zile=%s filter=%s: %s message(s) from %s page(s)",
+                self.user_id, cif, zile, filter_type or '-', len(all_mesaje), len(page_buckets)
+            )
             
             # Return combined result in same format as non-paginated version
+            # (metadata comes from the first page, it is the same on every page)
             return {
                 'mesaje': all_mesaje,
-                'serial': combined_serial,
-                'cui': combined_cui or cif,
-                'titlu': combined_titlu
+                'serial': first_page.get('serial', ''),
+                'cui': first_page.get('cui') or cif,
+                'titlu': first_page.get('titlu', '')
             }
             
         except requests.exceptions.RequestException as e:
+            self._invalidate_token(e)
             current_app.logger.error(f"Error listing invoices with pagination for CIF {cif}: {str(e)}")
             if hasattr(e, 'response') and e.response is not None:
                 current_app.logger.error(f"Error Response Status: {e.response.status_code}")
                 current_app.logger.error(f"Error Response Body: {e.response.text[:500]}")
             raise
     
-    def descarcare_factura(self, message_id):
+    def _fetch_lista_page(self, params, pagina, headers):
+        """Fetch one listaMesajePaginatieFactura page and return the parsed JSON"""
+        response = self._authorized_get(
+            self._url_lista,
+            params={**params, 'pagina': pagina},
+            headers=headers,
+            timeout=30
+        )
+        
+        response.raise_for_status()
+        # Parse the raw bytes directly (large listings are multi-MB)
+        response_data = _json_loads(response.content)
+        
+        if current_app.logger.isEnabledFor(logging.DEBUG):
+            current_app.logger.debug(
+                "ANAF listaMesajePaginatieFactura page=%s status=%s keys=%s",
+                pagina, response.status_code,
+                list(response_data.keys()) if isinstance(response_data, dict) else type(response_data).__name__
+            )
+            if pagina == 1:
+                current_app.logger.debug(
+                    "ANAF listaMesajePaginatieFactura Content-Encoding: %s",
+                    response.headers.get('Content-Encoding', 'none')
+                )
+        
+        return response_data
+    
+    @staticmethod
+    def _lista_total_pages(response_data):
+        """
+        Total page count reported by ANAF, or None if absent
+        
+        Uses numar_total_pagini, falling back to the record count divided by the
+        page size (numar_total_inregistrari / numar_total_inregistrari_per_pagina).
+        """
+        try:
+            return int(response_data['numar_total_pagini'])
+        except (KeyError, TypeError, ValueError):
+            pass
+        try:
+            total = int(response_data['numar_total_inregistrari'])
+            per_page = int(response_data['numar_total_inregistrari_per_pagina'])
+        except (KeyError, TypeError, ValueError):
+            return None
+        if per_page <= 0:
+            return None
+        return -(-total // per_page)
+    
+    def _lista_page_mesaje(self, response_data, pagina):
+        """
+        Return the messages of one listing page
+        
+        An empty list means there is nothing more to fetch: past the last page,
+        or no messages at all in the selected interval. Any other ANAF error
+        is raised as ValueError.
+        """
+        # Check for errors
+        if 'eroare' in response_data:
+            error_msg = response_data['eroare']
+            # Check if error indicates we've exceeded the total number of pages
+            if _END_OF_PAGES_RE.search(error_msg):
+                # This is a normal end-of-pagination condition, not a real error
+                if current_app.logger.isEnabledFor(logging.DEBUG):
+                    current_app.logger.debug("Reached end of pagination: %s", error_msg)
+                return []
+            elif _NO_MESSAGES_RE.search(error_msg):
+                # No messages in the selected interval - this is normal, not an error
+                current_app.logger.info("ANAF listaMesajePaginatieFactura user_id=%s: %s", self.user_id, error_msg)
+                return []
+            else:
+                # This is a real error, raise it
+                current_app.logger.error(f"ANAF API error on page {pagina}: {error_msg}")
+                raise ValueError(f"ANAF API error: {error_msg}")
+        
+        return response_data.get('mesaje', [])
+    
+    def lista_mesaje_factura_many(self, cifs, zile=60, max_workers=8):
+        """
+        List e-Factura messages for several CIFs concurrently
+        
+        Each CIF is listed by lista_mesaje_factura() in its own worker thread,
+        all of them sharing the module-level keep-alive session.
+        
+        Args:
+            cifs: Iterable of company CIFs (strings, digits only)
+            zile: Number of days to look back (integer, 1-90, default 60)
+            max_workers: Maximum number of concurrent listings (default 8)
+        
+        Returns:
+            Dictionary mapping each CIF to its lista_mesaje_factura() result,
+            or to the exception raised while listing it
+        """
+        cifs = list(dict.fromkeys(cifs))
+        if not cifs:
+            return {}
+        
+        # Resolve the access token once up front so workers reuse the cached one
+        self._get_access_token()
+        app = current_app._get_current_object()
+        
+        def listing(cif):
+            # Worker threads need their own app context for current_app logging
+            with app.app_context():
+                return self.lista_mesaje_factura(cif, zile=zile)
+        
+        results = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {cif: executor.submit(listing, cif) for cif in cifs}
+            for cif, future in futures.items():
+                try:
+                    results[cif] = future.result()
+                except Exception as e:
+                    results[cif] = e
+        
+        return results
+    
+    def descarcare_factura(self, message_id, sink=None):
         """
         Download e-Factura file (ZIP or XML) by ANAF message ID
         
@@ -282,51 +602,104 @@ class ANAFService:
         
         Args:
             message_id: ANAF message identifier (from listaMesajeFactura response)
+            sink: Optional binary file-like object; when given, the response body is
+                  streamed into it instead of being buffered in memory
         
         Returns:
-            Binary content (bytes) - typically ZIP archive containing invoice XML
+            Binary content (bytes) - typically ZIP archive containing invoice XML,
+            or the sink itself when one was provided
         """
         if not message_id:
             raise ValueError("message_id is required")
         
-        url = f"{self.base_url}/prod/FCTEL/rest/descarcare"
+        return self._descarcare_with_headers(message_id, self._get_download_headers(), sink=sink)
+    
+    def descarcare_factura_batch(self, message_ids, max_workers=8):
+        """
+        Download several e-Factura files concurrently
+        
+        Downloads are I/O-bound, so a small thread pool overlaps the network
+        round-trips over the shared keep-alive session. Authorization headers are
+        resolved once and reused by every worker.
+        
+        Args:
+            message_ids: Iterable of ANAF message identifiers
+            max_workers: Maximum number of concurrent downloads (default 8)
+        
+        Returns:
+            Dictionary mapping each message ID to its binary content (bytes),
+            or to the exception raised while downloading it
+        """
+        message_ids = [message_id for message_id in message_ids if message_id]
+        if not message_ids:
+            return {}
+        
+        headers = self._get_download_headers()
+        app = current_app._get_current_object()
+        
+        def download(message_id):
+            # Worker threads need their own app context for current_app logging
+            with app.app_context():
+                return self._descarcare_with_headers(message_id, headers)
+        
+        results = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {message_id: executor.submit(download, message_id) for message_id in message_ids}
+            for message_id, future in futures.items():
+                try:
+                    results[message_id] = future.result()
+                except Exception as e:
+                    results[message_id] = e
+        
+        return results
+    
+    def _descarcare_with_headers(self, message_id, headers, sink=None):
+        """Perform the descarcare request with already resolved headers"""
+        url = self._url_descarcare
         params = {
             'id': str(message_id)  # Ensure it's a string
         }
         
-        # Get headers but override Accept for binary content
-        headers = self._get_headers()
-        headers['Accept'] = 'application/octet-stream'
-        
-        current_app.logger.info(f"=== ANAF API REQUEST: Descarcare Factura ===")
-        current_app.logger.info(f"URL: {url}")
-        current_app.logger.info(f"Message ID: {message_id}")
-        current_app.logger.info(f"Full URL: {url}?id={message_id}")
-        
         try:
-            response = self.session.get(
+            response = self._authorized_get(
                 url,
                 params=params,
                 headers=headers,
-                timeout=60  # Longer timeout for file downloads
+                timeout=60,  # Longer timeout for file downloads
+                stream=sink is not None
             )
             
-            current_app.logger.info(f"Response Status: {response.status_code}")
-            current_app.logger.info(f"Content-Type: {response.headers.get('Content-Type', 'N/A')}")
-            current_app.logger.info(f"Content-Length: {response.headers.get('Content-Length', 'N/A')} bytes")
+            current_app.logger.info(
+                "ANAF descarcare id=%s status=%s", message_id, response.status_code
+            )
+            if current_app.logger.isEnabledFor(logging.DEBUG):
+                current_app.logger.debug(
+                    "Content-Type: %s, Content-Length: %s bytes",
+                    response.headers.get('Content-Type', 'N/A'),
+                    response.headers.get('Content-Length', 'N/A')
+                )
             
             response.raise_for_status()
             
+            if sink is not None:
+                # Copy the body into the sink chunk by chunk without buffering it
+                # (headers such as Content-Length are logged above, before iterating)
+                with response:
+                    for chunk in response.iter_content(chunk_size=65536):
+                        sink.write(chunk)
+                return sink
+            
             # Return binary content (not text)
             return response.content
             
         except requests.exceptions.RequestException as e:
+            self._invalidate_token(e)
             current_app.logger.error(f"Error downloading invoice {message_id}: {str(e)}")
             if hasattr(e, 'response') and e.response is not None:
                 current_app.logger.error(f"Error Response Status: {e.response.status_code}")
                 # Try to parse error message if JSON
                 try:
-                    error_data = e.response.json()
+                    error_data = _json_loads(e.response.content)
                     current_app.logger.error(f"Error Response Body: {error_data}")
                 except:
                     current_app.logger.error(f"Error Response Text: {e.response.text[:500]}")
@@ -351,18 +724,24 @@ class ANAFService:
         
         # For now, return empty list - will be implemented based on actual API
         # The company discovery will happen during OAuth callback or manual entry
-        # Note: Company discovery endpoint doesn't exist in ANAF API - companies must be added manually
-        url = f"{self.base_url}/api/user/companies"
+        # Note: Company discovery endpoint doesn't exist in ANAF API - companies must be added manually,
+        # so skip the guaranteed-to-fail HTTP call unless discovery is explicitly enabled
+        if not current_app.config.get('ANAF_HAS_COMPANY_DISCOVERY', False):
+            current_app.logger.debug("get_user_companies: no ANAF discovery endpoint; returning empty")
+            return []
+        
+        url = self._url_companies
         
         try:
-            response = self.session.get(
+            response = self._authorized_get(
                 url,
                 headers=self._get_headers(),
                 timeout=30
             )
             response.raise_for_status()
-            return response.json()
+            return _json_loads(response.content)
         except requests.exceptions.RequestException as e:
+            self._invalidate_token(e)
             current_app.logger.warning(f"Company discovery endpoint not available: {str(e)}")
             # Return empty list if endpoint doesn't exist
             return []
@@ -1,9 +1,119 @@
 import xmltodict
+import codecs
 import json
 import zipfile
 import io
-from datetime import datetime
+import sys
+import logging
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
 from decimal import Decimal, InvalidOperation
+from operator import itemgetter
+from flask import current_app, has_app_context
+
+try:
+    from lxml import etree
+except ImportError:  # Without lxml every invoice goes through the xmltodict walk
+    etree = None
+
+# UBL 2.1 namespaces used by e-Factura (Peppol BIS 3.0 / CIUS-RO) invoices
+UBL_NAMESPACES = {
+    'cac': 'urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2',
+    'cbc': 'urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2',
+}
+UBL_INVOICE_TAG = '{urn:oasis:names:specification:ubl:schema:xsd:Invoice-2}Invoice'
+
+# Result fields of parse_xml_to_json, all unset (the xmltodict walk fills them in)
+EMPTY_INVOICE_FIELDS = {
+    'supplier_name': None,
+    'supplier_cif': None,
+    'issuer_name': None,  # Extracted from AccountingSupplierParty (BT-27)
+    'receiver_name': None,  # Extracted from AccountingCustomerParty (BT-44)
+    'receiver_cif': None,  # Extracted from AccountingCustomerParty
+    'issuer_vat_id': None,  # BT-31
+    'receiver_vat_id': None,  # BT-48
+    'invoice_date': None,
+    'invoice_number': None,
+    'total_amount': None,
+    'currency': None
+}
+
+# Substrings marking amount-like keys for the last-resort total search.
+# payableamount, taxinclusiveamount, totalamount, amountdue, totalgeneral,
+# suma, ... all contain one of these, so they need no entries of their own.
+AMOUNT_KEY_PATTERNS = ('amount', 'total', 'sum', 'valoare')
+
+# Fields of each item returned by extract_invoice_line_items, all unset
+EMPTY_LINE_ITEM_FIELDS = {
+    'line_id': None,
+    'item_name': None,
+    'quantity': None,
+    'unit_code': None,
+    'unit_price': None,
+    'line_total': None,
+    'vat_rate': None,
+    'vat_category': None,
+    'currency': None
+}
+
+# Elements read by the lxml line item path, under their xmltodict keys
+UBL_LINE_KEYS = frozenset({'cbc:ID', 'cac:Item', 'cbc:InvoicedQuantity', 'cac:Price', 'cbc:LineExtensionAmount'})
+UBL_ITEM_KEYS = frozenset({'cbc:Name', 'cbc:Description', 'cac:ClassifiedTaxCategory'})
+UBL_TAX_CATEGORY_KEYS = frozenset({'cbc:Percent', 'cbc:ID'})
+UBL_PRICE_KEYS = frozenset({'cbc:PriceAmount'})
+
+# Field order of the tuple returned by InvoiceService.extract_invoice_fields
+INVOICE_FIELD_ORDER = (
+    'supplier_name', 'supplier_cif', 'invoice_date', 'total_amount', 'currency',
+    'issuer_name', 'receiver_name', 'issuer_vat_id', 'receiver_vat_id'
+)
+_get_invoice_fields = itemgetter(*INVOICE_FIELD_ORDER)
+
+# Bytes inflated from a ZIP member to decide whether it is the unsigned invoice
+# (at least the first 500 characters checked by extract_unsigned_xml_from_zip)
+XML_SNIFF_BYTES = 4096
+
+# Field-only parse results kept per process (least recently used evicted first),
+# keyed by a digest of the XML content so the documents themselves aren't kept alive
+PARSE_CACHE_SIZE = 64
+_parse_cache = OrderedDict()
+_parse_cache_lock = threading.Lock()
+
+# Relative paths read by the lxml fast path, compiled once at import
+UBL_PATHS = {
+    'supplier_party': 'cac:AccountingSupplierParty/cac:Party',
+    'customer_party': 'cac:AccountingCustomerParty/cac:Party',
+    'legal_monetary_total': 'cac:LegalMonetaryTotal',
+    'registration_name': 'cac:PartyLegalEntity/cbc:RegistrationName',
+    'party_name': 'cac:PartyName/cbc:Name',
+    'tax_scheme_id': 'cac:TaxScheme/cbc:ID',
+    'company_id': 'cbc:CompanyID',
+    'id': 'cbc:ID',
+    'issue_date': 'cbc:IssueDate',
+    'document_currency': 'cbc:DocumentCurrencyCode',
+    'tax_inclusive_amount': 'cbc:TaxInclusiveAmount',
+    'payable_amount': 'cbc:PayableAmount',
+    'tax_exclusive_amount': 'cbc:TaxExclusiveAmount',
+    'line_extension_amount': 'cbc:LineExtensionAmount',
+}
+if etree is not None:
+    # "(path)[1]" - only the first match is ever used
+    UBL_XPATHS = {
+        name: etree.XPath(f'({path})[1]', namespaces=UBL_NAMESPACES)
+        for name, path in UBL_PATHS.items()
+    }
+    UBL_XPATHS['party_tax_schemes'] = etree.XPath('cac:PartyTaxScheme', namespaces=UBL_NAMESPACES)
+
+# Sentinel for dict lookups where None is a valid value
+_MISSING = object()
+
+def _debug_logger():
+    """The app logger if DEBUG logging is enabled in the current app context, else None"""
+    if has_app_context() and current_app.logger.isEnabledFor(logging.DEBUG):
+        return current_app.logger
+    return None
 
 class InvoiceService:
     """Service for parsing and processing invoices"""
@@ -36,44 +146,27 @@ class InvoiceService:
             
             if not unsigned_xml_files:
                 # No file without "semnatura_" prefix - check all files by content
-                for xml_file in all_xml_files:
-                    try:
-                        content = zip_file.read(xml_file).decode('utf-8')
-                        stripped = content.strip()
-                        # Check if it's unsigned Invoice XML (has Invoice root, not Signature)
-                        if (stripped.startswith('<Invoice') or 
-                            (stripped.startswith('<?xml') and '<Invoice' in content[:500] and 
-                             '<Signature' not in content[:500])):
-                            return content, xml_file
-                    except Exception:
-                        continue
-                return None, None
+                return InvoiceService._find_unsigned_xml(zip_file, all_xml_files)
             
             # Use the file without "semnatura_" prefix (should be {id}.xml)
             unsigned_file = unsigned_xml_files[0]
-            xml_content = zip_file.read(unsigned_file).decode('utf-8')
             
-            # Verify it's actually unsigned Invoice XML (not signed)
-            stripped = xml_content.strip()
+            # Check if it's signed (has Signature wrapper) before inflating the whole file
+            def is_not_signed(head):
+                stripped = head.lstrip()
+                return not (stripped.startswith('<Signature') or '<Signature' in stripped[:500])
             
-            # Check if it's signed (has Signature wrapper)
-            if stripped.startswith('<Signature') or '<Signature' in stripped[:500]:
+            xml_content = InvoiceService._read_zip_xml(zip_file, unsigned_file, is_not_signed)
+            if xml_content is None:
                 # Wrong file - this is signed XML
                 # Try other files
-                for xml_file in all_xml_files:
-                    if xml_file != unsigned_file:
-                        try:
-                            content = zip_file.read(xml_file).decode('utf-8')
-                            stripped_check = content.strip()
-                            if (stripped_check.startswith('<Invoice') or 
-                                (stripped_check.startswith('<?xml') and '<Invoice' in content[:500] and 
-                                 '<Signature' not in content[:500])):
-                                return content, xml_file
-                        except Exception:
-                            continue
-                return None, None
+                return InvoiceService._find_unsigned_xml(
+                    zip_file,
+                    [f for f in all_xml_files if f != unsigned_file]
+                )
             
             # Verify it has Invoice root element
+            stripped = xml_content.strip()
             if not (stripped.startswith('<Invoice') or 
                     (stripped.startswith('<?xml') and '<Invoice' in xml_content[:500])):
                 return None, None
@@ -83,6 +176,44 @@ class InvoiceService:
         except Exception as e:
             return None, None
     
+    @staticmethod
+    def _find_unsigned_xml(zip_file, xml_files):
+        """First of xml_files whose content is unsigned Invoice XML, as (xml_content, filename)"""
+        def is_unsigned_invoice(head):
+            # Has Invoice root, not Signature
+            stripped = head.lstrip()
+            return (stripped.startswith('<Invoice') or 
+                    (stripped.startswith('<?xml') and '<Invoice' in head[:500] and 
+                     '<Signature' not in head[:500]))
+        
+        for xml_file in xml_files:
+            try:
+                content = InvoiceService._read_zip_xml(zip_file, xml_file, is_unsigned_invoice)
+            except Exception:
+                continue
+            if content is not None:
+                return content, xml_file
+        return None, None
+    
+    @staticmethod
+    def _read_zip_xml(zip_file, name, accept):
+        """
+        Read a ZIP member as UTF-8 text if its beginning passes accept
+        
+        Only the first XML_SNIFF_BYTES are inflated before accept(head) is called
+        with their text, so rejected members - usually the signed copy - are
+        never decompressed in full.
+        
+        Returns:
+            str: Member content, or None if rejected
+        """
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        with zip_file.open(name) as member:
+            head = decoder.decode(member.read(XML_SNIFF_BYTES))
+            if not accept(head):
+                return None
+            return head + decoder.decode(member.read(), final=True)
+    
     @staticmethod
     def _extract_text_value(value):
         """
@@ -95,14 +226,15 @@ class InvoiceService:
         Returns:
             String value or None
         """
+        # Plain text is by far the most common case: exact type check first
+        if type(value) is str:
+            return value.strip() or None
         if value is None:
             return None
         if isinstance(value, dict):
             # xmltodict returns dicts with #text key for text content
             # Also check for @text or text keys
             return value.get('#text') or value.get('text') or value.get('@text') or None
-        if isinstance(value, str):
-            return value.strip() if value.strip() else None
         # Fallback: convert to string
         result = str(value) if value else None
         return result.strip() if result else None
@@ -124,29 +256,333 @@ class InvoiceService:
             return default
         
         for key_path in keys:
-            if isinstance(key_path, str):
-                # Single key
-                if key_path in data:
-                    return data[key_path]
+            if type(key_path) is str:
+                # Single key - one hash lookup instead of "in" followed by []
+                value = data.get(key_path, _MISSING)
+                if value is not _MISSING:
+                    return value
             else:
                 # List of keys for nested access
                 current = data
-                try:
-                    for key in key_path:
-                        if isinstance(current, dict) and key in current:
-                            current = current[key]
-                        else:
-                            current = None
-                            break
-                    if current is not None:
-                        return current
-                except (TypeError, AttributeError):
-                    continue
+                for key in key_path:
+                    if not isinstance(current, dict):
+                        current = None
+                        break
+                    current = current.get(key)
+                    if current is None:
+                        break
+                if current is not None:
+                    return current
         
         return default
     
     @staticmethod
-    def parse_xml_to_json(xml_content):
+    def _walk_party_name(party, role, debug_logger=None):
+        """
+        Name of an xmltodict Party: PartyLegalEntity/RegistrationName, else PartyName/Name
+        
+        Args:
+            party: Party dict of AccountingSupplierParty or AccountingCustomerParty
+            role: 'Supplier' or 'Customer', only used in debug messages
+            debug_logger: Logger from _debug_logger(), or None
+        
+        Returns:
+            str or None
+        """
+        extract_text = InvoiceService._extract_text_value
+        safe_get = InvoiceService._safe_get
+        
+        # Namespace-prefixed keys first since we're not stripping namespaces
+        party_legal_entity = safe_get(
+            party,
+            'cac:PartyLegalEntity',
+            'PartyLegalEntity',
+            'partyLegalEntity',
+            default={}
+        )
+        
+        if party_legal_entity and isinstance(party_legal_entity, dict):
+            if debug_logger:
+                debug_logger.debug(f"[PARSE_XML] {role} party legal entity keys: {list(party_legal_entity.keys())}")
+            registration_name_raw = safe_get(
+                party_legal_entity,
+                'cbc:RegistrationName',
+                'RegistrationName',
+                'registrationName'
+            )
+            
+            if debug_logger:
+                debug_logger.debug(f"[PARSE_XML] {role} registration name raw: {registration_name_raw}")
+            registration_name = extract_text(registration_name_raw)
+            if debug_logger:
+                debug_logger.debug(f"[PARSE_XML] {role} name extracted: {registration_name}")
+            if registration_name:
+                return registration_name
+        
+        # Fallback: try PartyName -> Name
+        # Try direct access first (when process_namespaces=True, keys are stripped)
+        party_name_obj = party.get('PartyName') or party.get('cac:PartyName')
+        
+        if not party_name_obj:
+            party_name_obj = safe_get(
+                party,
+                'PartyName',
+                'partyName',
+                'cac:PartyName',
+                default={}
+            )
+        
+        if party_name_obj:
+            # Try direct access for Name
+            party_name_raw = None
+            if isinstance(party_name_obj, dict):
+                party_name_raw = party_name_obj.get('Name') or party_name_obj.get('cbc:Name')
+            
+            if not party_name_raw:
+                party_name_raw = safe_get(
+                    party_name_obj,
+                    'Name',
+                    'name',
+                    'cbc:Name'
+                )
+            
+            return extract_text(party_name_raw)
+        return None
+    
+    @staticmethod
+    def _walk_party_vat_id(party):
+        """
+        VAT ID of an xmltodict Party: CompanyID of its first VAT (or unnamed) PartyTaxScheme
+        
+        Note: PartyTaxScheme can appear 0..2 times, look for one with VAT scheme
+        """
+        extract_text = InvoiceService._extract_text_value
+        safe_get = InvoiceService._safe_get
+        tax_schemes = safe_get(
+            party,
+            'cac:PartyTaxScheme',
+            'PartyTaxScheme',
+            'partyTaxScheme',
+            default=None
+        )
+        if not tax_schemes:
+            return None
+        
+        # Handle both single item and list
+        if not isinstance(tax_schemes, list):
+            tax_schemes = [tax_schemes]
+        
+        for tax_scheme in tax_schemes:
+            if not isinstance(tax_scheme, dict):
+                continue
+            
+            # Check if this is VAT scheme
+            tax_scheme_id = safe_get(
+                tax_scheme,
+                ['cac:TaxScheme', 'cbc:ID'],
+                ['TaxScheme', 'ID'],
+                ['taxScheme', 'id'],
+                'cbc:ID',
+                'ID',
+                'id'
+            )
+            
+            # If VAT scheme or no scheme specified, extract CompanyID
+            if not tax_scheme_id or extract_text(tax_scheme_id) == 'VAT':
+                company_id = extract_text(safe_get(
+                    tax_scheme,
+                    'cbc:CompanyID',
+                    'CompanyID',
+                    'companyID'
+                ))
+                if company_id:
+                    return company_id
+        return None
+    
+    @staticmethod
+    def _ubl_element(element, name):
+        """First element under element matching the precompiled UBL path `name`, or None"""
+        found = UBL_XPATHS[name](element)
+        return found[0] if found else None
+    
+    @staticmethod
+    def _ubl_element_text(element):
+        """Stripped character data of element, or None"""
+        if len(element):
+            # Comments, PIs and child elements split the text (the rest sits in
+            # their tails); xmltodict joins the element's own pieces
+            text = (element.text or '') + ''.join(child.tail or '' for child in element)
+        else:
+            text = element.text
+        if not text:
+            return None
+        return text.strip() or None
+    
+    @staticmethod
+    def _ubl_text(element, name):
+        """Stripped text of the first element matching UBL path `name`, or None"""
+        found = UBL_XPATHS[name](element)
+        if not found:
+            return None
+        return InvoiceService._ubl_element_text(found[0])
+    
+    @staticmethod
+    def _parse_issue_date(value):
+        """
+        Parse a YYYY-MM-DD issue date (BT-2), or None if it isn't one
+        
+        The canonical zero-padded form goes through date.fromisoformat (C code);
+        anything else keeps strptime's more lenient '%Y-%m-%d' parsing.
+        """
+        if len(value) == 10 and value[4] == '-' and value[7] == '-':
+            try:
+                return date.fromisoformat(value)
+            except ValueError:
+                pass
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            return None
+    
+    @staticmethod
+    def _ubl_amount(element, expected_currency=None):
+        """
+        Extract (amount, currency) from a UBL amount element
+        
+        Same rules as the xmltodict walk: an amount whose currencyID differs
+        from expected_currency is ignored, unparsable amounts become None.
+        """
+        currency_value = element.get('currencyID')
+        if expected_currency and currency_value and currency_value != expected_currency:
+            return None, currency_value
+        
+        amount_value = None
+        amount_text = InvoiceService._ubl_element_text(element)
+        if amount_text:
+            try:
+                amount_value = Decimal(amount_text)
+            except (ValueError, TypeError, InvalidOperation):
+                pass
+        return amount_value, currency_value
+    
+    @staticmethod
+    def _ubl_party_name(party):
+        """Party name from PartyLegalEntity/RegistrationName (BT-27/BT-44), else PartyName/Name"""
+        return (
+            InvoiceService._ubl_text(party, 'registration_name')
+            or InvoiceService._ubl_text(party, 'party_name')
+        )
+    
+    @staticmethod
+    def _ubl_party_vat_id(party):
+        """CompanyID of the party's VAT PartyTaxScheme (or of one without a scheme ID)"""
+        for tax_scheme in UBL_XPATHS['party_tax_schemes'](party):
+            scheme_id = (
+                InvoiceService._ubl_text(tax_scheme, 'tax_scheme_id')
+                or InvoiceService._ubl_text(tax_scheme, 'id')
+            )
+            if not scheme_id or scheme_id == 'VAT':
+                company_id = InvoiceService._ubl_text(tax_scheme, 'company_id')
+                if company_id:
+                    return company_id
+        return None
+    
+    @staticmethod
+    def _parse_ubl_root(xml_content):
+        """Parse xml_content with lxml; the root element if it is a UBL Invoice, else None"""
+        if etree is None:
+            return None
+        
+        try:
+            if isinstance(xml_content, str):
+                # Already decoded: ignore the encoding named in the XML declaration
+                parser = etree.XMLParser(resolve_entities=False, no_network=True, encoding='utf-8')
+                root = etree.fromstring(xml_content.encode('utf-8'), parser)
+            else:
+                parser = etree.XMLParser(resolve_entities=False, no_network=True)
+                root = etree.fromstring(xml_content, parser)
+        except (etree.XMLSyntaxError, ValueError, TypeError):
+            return None
+        
+        # DTDs (and their entities) are rejected by the xmltodict path; let it report them
+        if root.tag != UBL_INVOICE_TAG or root.getroottree().docinfo.internalDTD is not None:
+            return None
+        return root
+    
+    @staticmethod
+    def _parse_ubl_fields(xml_content):
+        """
+        Read the invoice fields straight from a standard UBL Invoice with lxml
+        
+        Only the handful of elements we need are looked up, by namespace, so
+        the prefixes used in the document don't matter. Returns None when lxml
+        is unavailable, the XML isn't a plain UBL Invoice, or a field would need
+        the fuzzy fallbacks of the xmltodict walk (missing party names, missing
+        or zero totals) - the caller then falls back to that walk.
+        """
+        root = InvoiceService._parse_ubl_root(xml_content)
+        if root is None:
+            return None
+        
+        supplier_party = InvoiceService._ubl_element(root, 'supplier_party')
+        customer_party = InvoiceService._ubl_element(root, 'customer_party')
+        legal_monetary_total = InvoiceService._ubl_element(root, 'legal_monetary_total')
+        if supplier_party is None or customer_party is None or legal_monetary_total is None:
+            return None
+        
+        issuer_name = InvoiceService._ubl_party_name(supplier_party)
+        receiver_name = InvoiceService._ubl_party_name(customer_party)
+        if not issuer_name or not receiver_name:
+            return None
+        issuer_vat_id = InvoiceService._ubl_party_vat_id(supplier_party)
+        
+        issue_date = InvoiceService._ubl_text(root, 'issue_date')
+        invoice_date = InvoiceService._parse_issue_date(issue_date) if issue_date else None
+        
+        # Totals (BT-112, BT-115, then BT-109 and line sum) with the same
+        # precedence and currency matching as the xmltodict walk
+        currency = InvoiceService._ubl_text(root, 'document_currency')
+        total_amount = None
+        for name, fallback_only, match_currency in (
+            ('tax_inclusive_amount', False, True),
+            ('payable_amount', False, True),
+            ('tax_exclusive_amount', True, True),
+            ('line_extension_amount', True, False),
+        ):
+            if fallback_only and total_amount:
+                continue
+            amount_element = InvoiceService._ubl_element(legal_monetary_total, name)
+            if amount_element is None:
+                continue
+            amount_value, currency_value = InvoiceService._ubl_amount(
+                amount_element, currency if match_currency else None
+            )
+            if amount_value is not None:
+                total_amount = amount_value
+            if currency_value and not currency:
+                currency = currency_value
+        if not total_amount:
+            return None
+        
+        # The buyer VAT ID (BT-48) is only taken from the XML when no buyer name
+        # was found, which always falls back above - mirror the walk's result
+        return {
+            'supplier_name': issuer_name,
+            'supplier_cif': issuer_vat_id,
+            'issuer_name': issuer_name,
+            'receiver_name': receiver_name,
+            'receiver_cif': None,
+            'issuer_vat_id': issuer_vat_id,
+            'receiver_vat_id': None,
+            'invoice_date': invoice_date,
+            'invoice_number': InvoiceService._ubl_text(root, 'id'),
+            'total_amount': total_amount,
+            # A handful of ISO 4217 codes repeated on every invoice: share one str each
+            'currency': sys.intern(currency) if currency else None
+        }
+    
+    @staticmethod
+    def parse_xml_to_json(xml_content, include_raw=True):
         """
         Parse UBL XML invoice to JSON following Peppol UBL 3.0 structure
         Documentation: https://docs.peppol.eu/poacc/billing/3.0/syntax/ubl-invoice/tree/
@@ -156,31 +592,69 @@ class InvoiceService:
         
         Args:
             xml_content: XML string content (unsigned Invoice XML)
+            include_raw: Include the full xmltodict tree under 'raw'. Pass False
+                when only the extracted fields are needed to skip building it.
         
         Returns:
             Dictionary with parsed invoice data
         """
+        if include_raw:
+            return InvoiceService._parse_xml(xml_content, include_raw=True)
+        # Field-only results are memoized by content: reparse runs and sync
+        # updates keep seeing the same stored XML. Copy so callers can't
+        # modify the cached dict.
+        return dict(InvoiceService._parse_fields_cached(xml_content))
+    
+    @staticmethod
+    def _parse_fields_cached(xml_content):
+        """Cached _parse_xml(include_raw=False) - the returned dict is shared, don't modify it"""
+        # str and bytes are parsed differently (the XML declaration's encoding only
+        # applies to bytes), so the type is part of the key
+        if isinstance(xml_content, str):
+            key = (str, hashlib.blake2b(xml_content.encode('utf-8', 'surrogatepass'), digest_size=16).digest())
+        elif isinstance(xml_content, bytes):
+            key = (bytes, hashlib.blake2b(xml_content, digest_size=16).digest())
+        else:
+            return InvoiceService._parse_xml(xml_content, include_raw=False)
+        
+        with _parse_cache_lock:
+            fields = _parse_cache.get(key)
+            if fields is not None:
+                _parse_cache.move_to_end(key)
+                return fields
+        
+        fields = InvoiceService._parse_xml(xml_content, include_raw=False)
+        with _parse_cache_lock:
+            _parse_cache[key] = fields
+            _parse_cache.move_to_end(key)
+            if len(_parse_cache) > PARSE_CACHE_SIZE:
+                _parse_cache.popitem(last=False)
+        return fields
+    
+    @staticmethod
+    def _parse_xml(xml_content, include_raw):
+        """Uncached implementation of parse_xml_to_json"""
+        # Local aliases: called for nearly every field of the xmltodict walk
+        extract_text = InvoiceService._extract_text_value
+        safe_get = InvoiceService._safe_get
+        # Resolved once: None unless DEBUG logging is on inside an app context
+        debug_logger = _debug_logger()
+        
+        # Fast path: standard UBL invoices are read directly with lxml
+        fields = InvoiceService._parse_ubl_fields(xml_content)
+        if fields is not None and not include_raw:
+            return fields
+        
         try:
             # Parse XML to ordered dict
             # Parse without namespace processing to keep namespace prefixes (cac:, cbc:, etc.)
             # This is more reliable than process_namespaces=True which can create full URI keys
             invoice_dict = xmltodict.parse(xml_content)
+            if fields is not None:
+                return {'raw': invoice_dict, **fields}
             
             # Extract key information from UBL structure
-            invoice_data = {
-                'raw': invoice_dict,
-                'supplier_name': None,
-                'supplier_cif': None,
-                'issuer_name': None,  # Extracted from AccountingSupplierParty (BT-27)
-                'receiver_name': None,  # Extracted from AccountingCustomerParty (BT-44)
-                'receiver_cif': None,  # Extracted from AccountingCustomerParty
-                'issuer_vat_id': None,  # BT-31
-                'receiver_vat_id': None,  # BT-48
-                'invoice_date': None,
-                'invoice_number': None,
-                'total_amount': None,
-                'currency': None
-            }
+            invoice_data = {'raw': invoice_dict, **EMPTY_INVOICE_FIELDS}
             
             # Navigate UBL structure - unsigned XML should have Invoice as root
             # Handle both namespace-prefixed and non-prefixed Invoice elements
@@ -223,7 +697,7 @@ class InvoiceService:
                     for k, v in obj.items():
                         k_lower = str(k).lower()
                         if any(ck.lower() == k_lower for ck in candidate_keys):
-                            val = InvoiceService._extract_text_value(v)
+                            val = extract_text(v)
                             if val:
                                 return val
                         res = _find_first_text(v, candidate_keys, depth+1, max_depth)
@@ -259,28 +733,24 @@ class InvoiceService:
 
             # Extract supplier/issuer information (SELLER)
             # Path: cac:AccountingSupplierParty/cac:Party/cac:PartyLegalEntity/cbc:RegistrationName (BT-27)
-            try:
-                current_app.logger.debug(f"[PARSE_XML] Invoice root keys: {list(invoice_root.keys())[:20] if isinstance(invoice_root, dict) else 'Not a dict'}")
-            except:
-                pass
+            if debug_logger:
+                debug_logger.debug(f"[PARSE_XML] Invoice root keys: {list(invoice_root.keys())[:20] if isinstance(invoice_root, dict) else 'Not a dict'}")
             
             # Since we're not using process_namespaces, keys will have prefixes like cac:, cbc:
-            supplier_party = InvoiceService._safe_get(
+            supplier_party = safe_get(
                 invoice_root,
                 ['cac:AccountingSupplierParty', 'cac:Party'],  # Try with namespace prefix first
                 ['AccountingSupplierParty', 'Party'],  # Fallback to stripped (unlikely with our parsing)
                 default={}
             )
-            try:
-                current_app.logger.debug(f"[PARSE_XML] Supplier party via _safe_get: {supplier_party is not None and isinstance(supplier_party, dict)}")
-            except:
-                pass
+            if debug_logger:
+                debug_logger.debug(f"[PARSE_XML] Supplier party via _safe_get: {supplier_party is not None and isinstance(supplier_party, dict)}")
             if not supplier_party:
                 # Try to find AccountingSupplierParty section
                 supplier_section = _find_section(invoice_root, ['accountingsupplierparty'])
                 if supplier_section:
                     # Extract Party from within AccountingSupplierParty
-                    supplier_party = InvoiceService._safe_get(
+                    supplier_party = safe_get(
                         supplier_section,
                         'cac:Party',
                         'Party',
@@ -294,131 +764,16 @@ class InvoiceService:
             if supplier_party and isinstance(supplier_party, dict):
                 # Extract issuer name from PartyLegalEntity -> RegistrationName (BT-27)
                 # Also try PartyName as fallback (BT-28)
-                # Try direct access first (namespace-prefixed keys since we're not stripping namespaces)
-                party_legal_entity = None
-                if 'cac:PartyLegalEntity' in supplier_party:  # Check prefixed key first
-                    party_legal_entity = supplier_party['cac:PartyLegalEntity']
-                elif 'PartyLegalEntity' in supplier_party:  # Fallback to stripped
-                    party_legal_entity = supplier_party['PartyLegalEntity']
-                else:
-                    party_legal_entity = InvoiceService._safe_get(
-                        supplier_party,
-                        'cac:PartyLegalEntity',
-                        'PartyLegalEntity',
-                        'partyLegalEntity',
-                        default={}
-                    )
-                
-                if party_legal_entity and isinstance(party_legal_entity, dict):
-                    try:
-                        current_app.logger.debug(f"[PARSE_XML] Party legal entity keys: {list(party_legal_entity.keys())}")
-                    except:
-                        pass
-                    # Try direct access for RegistrationName (namespace-prefixed keys first)
-                    registration_name_raw = None
-                    if 'cbc:RegistrationName' in party_legal_entity:  # Check prefixed key first
-                        registration_name_raw = party_legal_entity['cbc:RegistrationName']
-                    elif 'RegistrationName' in party_legal_entity:  # Fallback to stripped
-                        registration_name_raw = party_legal_entity['RegistrationName']
-                    else:
-                        registration_name_raw = InvoiceService._safe_get(
-                            party_legal_entity,
-                            'cbc:RegistrationName',
-                            'RegistrationName',
-                            'registrationName'
-                        )
-                    
-                    try:
-                        current_app.logger.debug(f"[PARSE_XML] Registration name raw: {registration_name_raw}")
-                    except:
-                        pass
-                    registration_name = InvoiceService._extract_text_value(registration_name_raw)
-                    try:
-                        current_app.logger.debug(f"[PARSE_XML] Issuer name extracted: {registration_name}")
-                    except:
-                        pass
-                    if registration_name:
-                        invoice_data['supplier_name'] = registration_name
-                        invoice_data['issuer_name'] = registration_name
-                
-                # Fallback: try PartyName -> Name (BT-28)
-                if not invoice_data['issuer_name']:
-                    # Try direct access first (when process_namespaces=True, keys are stripped)
-                    party_name_obj = None
-                    if isinstance(supplier_party, dict):
-                        party_name_obj = supplier_party.get('PartyName') or supplier_party.get('cac:PartyName')
-                    
-                    if not party_name_obj:
-                        party_name_obj = InvoiceService._safe_get(
-                            supplier_party,
-                            'PartyName',
-                            'partyName',
-                            'cac:PartyName',
-                            default={}
-                        )
-                    
-                    if party_name_obj:
-                        # Try direct access for Name
-                        party_name_raw = None
-                        if isinstance(party_name_obj, dict):
-                            party_name_raw = party_name_obj.get('Name') or party_name_obj.get('cbc:Name')
-                        
-                        if not party_name_raw:
-                            party_name_raw = InvoiceService._safe_get(
-                                party_name_obj,
-                                'Name',
-                                'name',
-                                'cbc:Name'
-                            )
-                        
-                        party_name = InvoiceService._extract_text_value(party_name_raw)
-                        if party_name:
-                            invoice_data['supplier_name'] = party_name
-                            invoice_data['issuer_name'] = party_name
+                issuer_name = InvoiceService._walk_party_name(supplier_party, 'Supplier', debug_logger)
+                if issuer_name:
+                    invoice_data['supplier_name'] = issuer_name
+                    invoice_data['issuer_name'] = issuer_name
                 
                 # Extract issuer VAT ID from PartyTaxScheme -> CompanyID (BT-31)
-                # Note: PartyTaxScheme can appear 0..2 times, look for one with VAT scheme
-                tax_schemes = InvoiceService._safe_get(
-                    supplier_party,
-                    'cac:PartyTaxScheme',
-                    'PartyTaxScheme',
-                    'partyTaxScheme',
-                    default=None
-                )
-                
-                # Handle both single item and list
-                if tax_schemes:
-                    if not isinstance(tax_schemes, list):
-                        tax_schemes = [tax_schemes]
-                    
-                    for tax_scheme in tax_schemes:
-                        if not isinstance(tax_scheme, dict):
-                            continue
-                        
-                        # Check if this is VAT scheme
-                        tax_scheme_id = InvoiceService._safe_get(
-                            tax_scheme,
-                            ['cac:TaxScheme', 'cbc:ID'],
-                            ['TaxScheme', 'ID'],
-                            ['taxScheme', 'id'],
-                            'cbc:ID',
-                            'ID',
-                            'id'
-                        )
-                        
-                        # If VAT scheme or no scheme specified, extract CompanyID
-                        if not tax_scheme_id or InvoiceService._extract_text_value(tax_scheme_id) == 'VAT':
-                            company_id_raw = InvoiceService._safe_get(
-                                tax_scheme,
-                                'cbc:CompanyID',
-                                'CompanyID',
-                                'companyID'
-                            )
-                            company_id = InvoiceService._extract_text_value(company_id_raw)
-                            if company_id:
-                                invoice_data['supplier_cif'] = company_id
-                                invoice_data['issuer_vat_id'] = company_id
-                                break
+                issuer_vat_id = InvoiceService._walk_party_vat_id(supplier_party)
+                if issuer_vat_id:
+                    invoice_data['supplier_cif'] = issuer_vat_id
+                    invoice_data['issuer_vat_id'] = issuer_vat_id
             
             # Extra fallback for issuer/supplier name: search within supplier_party if we found it
             if not invoice_data['issuer_name'] and supplier_party:
@@ -433,22 +788,20 @@ class InvoiceService:
             
             # Extract customer/receiver information (BUYER)
             # Path: cac:AccountingCustomerParty/cac:Party/cac:PartyLegalEntity/cbc:RegistrationName (BT-44)
-            customer_party = InvoiceService._safe_get(
+            customer_party = safe_get(
                 invoice_root,
                 ['cac:AccountingCustomerParty', 'cac:Party'],  # Try with namespace prefix first
                 ['AccountingCustomerParty', 'Party'],  # Fallback to stripped (unlikely with our parsing)
                 default={}
             )
-            try:
-                current_app.logger.debug(f"[PARSE_XML] Customer party via _safe_get: {customer_party is not None and isinstance(customer_party, dict)}")
-            except:
-                pass
+            if debug_logger:
+                debug_logger.debug(f"[PARSE_XML] Customer party via _safe_get: {customer_party is not None and isinstance(customer_party, dict)}")
             if not customer_party:
                 # Try to find AccountingCustomerParty section
                 customer_section = _find_section(invoice_root, ['accountingcustomerparty'])
                 if customer_section:
                     # Extract Party from within AccountingCustomerParty
-                    customer_party = InvoiceService._safe_get(
+                    customer_party = safe_get(
                         customer_section,
                         'cac:Party',
                         'Party',
@@ -461,85 +814,10 @@ class InvoiceService:
             
             if customer_party and isinstance(customer_party, dict):
                 # Extract receiver name from PartyLegalEntity -> RegistrationName (BT-44)
-                # Try direct access first (namespace-prefixed keys since we're not stripping namespaces)
-                party_legal_entity = None
-                if 'cac:PartyLegalEntity' in customer_party:  # Check prefixed key first
-                    party_legal_entity = customer_party['cac:PartyLegalEntity']
-                elif 'PartyLegalEntity' in customer_party:  # Fallback to stripped
-                    party_legal_entity = customer_party['PartyLegalEntity']
-                else:
-                    party_legal_entity = InvoiceService._safe_get(
-                        customer_party,
-                        'cac:PartyLegalEntity',
-                        'PartyLegalEntity',
-                        'partyLegalEntity',
-                        default={}
-                    )
-                
-                if party_legal_entity and isinstance(party_legal_entity, dict):
-                    try:
-                        current_app.logger.debug(f"[PARSE_XML] Customer party legal entity keys: {list(party_legal_entity.keys())}")
-                    except:
-                        pass
-                    # Try direct access for RegistrationName (namespace-prefixed keys first)
-                    registration_name_raw = None
-                    if 'cbc:RegistrationName' in party_legal_entity:  # Check prefixed key first
-                        registration_name_raw = party_legal_entity['cbc:RegistrationName']
-                    elif 'RegistrationName' in party_legal_entity:  # Fallback to stripped
-                        registration_name_raw = party_legal_entity['RegistrationName']
-                    else:
-                        registration_name_raw = InvoiceService._safe_get(
-                            party_legal_entity,
-                            'cbc:RegistrationName',
-                            'RegistrationName',
-                            'registrationName'
-                        )
-                    
-                    try:
-                        current_app.logger.debug(f"[PARSE_XML] Customer registration name raw: {registration_name_raw}")
-                    except:
-                        pass
-                    registration_name = InvoiceService._extract_text_value(registration_name_raw)
-                    try:
-                        current_app.logger.debug(f"[PARSE_XML] Receiver name extracted: {registration_name}")
-                    except:
-                        pass
-                    if registration_name:
-                        invoice_data['receiver_name'] = registration_name
-                
-                # Fallback: try PartyName -> Name (BT-45)
-                if not invoice_data['receiver_name']:
-                    # Try direct access first (when process_namespaces=True, keys are stripped)
-                    party_name_obj = None
-                    if isinstance(customer_party, dict):
-                        party_name_obj = customer_party.get('PartyName') or customer_party.get('cac:PartyName')
-                    
-                    if not party_name_obj:
-                        party_name_obj = InvoiceService._safe_get(
-                            customer_party,
-                            'PartyName',
-                            'partyName',
-                            'cac:PartyName',
-                            default={}
-                        )
-                    
-                    if party_name_obj:
-                        # Try direct access for Name
-                        party_name_raw = None
-                        if isinstance(party_name_obj, dict):
-                            party_name_raw = party_name_obj.get('Name') or party_name_obj.get('cbc:Name')
-                        
-                        if not party_name_raw:
-                            party_name_raw = InvoiceService._safe_get(
-                                party_name_obj,
-                                'Name',
-                                'name',
-                                'cbc:Name'
-                            )
-                        
-                        party_name = InvoiceService._extract_text_value(party_name_raw)
-                        if party_name:
-                            invoice_data['receiver_name'] = party_name
+                # Also try PartyName as fallback (BT-45)
+                receiver_name = InvoiceService._walk_party_name(customer_party, 'Customer', debug_logger)
+                if receiver_name:
+                    invoice_data['receiver_name'] = receiver_name
             
             # Extra fallback for receiver name: search within customer_party if we found it
             if not invoice_data['receiver_name'] and customer_party:
@@ -551,65 +829,25 @@ class InvoiceService:
                     invoice_data['receiver_name'] = receiver_fallback
                 
                 # Extract receiver VAT ID from PartyTaxScheme -> CompanyID (BT-48)
-                tax_schemes = InvoiceService._safe_get(
-                    customer_party,
-                    'cac:PartyTaxScheme',
-                    'PartyTaxScheme',
-                    'partyTaxScheme',
-                    default=None
-                )
-                
-                if tax_schemes:
-                    if not isinstance(tax_schemes, list):
-                        tax_schemes = [tax_schemes]
-                    
-                    for tax_scheme in tax_schemes:
-                        if not isinstance(tax_scheme, dict):
-                            continue
-                        
-                        # Check if this is VAT scheme
-                        tax_scheme_id = InvoiceService._safe_get(
-                            tax_scheme,
-                            ['cac:TaxScheme', 'cbc:ID'],
-                            ['TaxScheme', 'ID'],
-                            ['taxScheme', 'id'],
-                            'cbc:ID',
-                            'ID',
-                            'id'
-                        )
-                        
-                        # If VAT scheme or no scheme specified, extract CompanyID
-                        if not tax_scheme_id or InvoiceService._extract_text_value(tax_scheme_id) == 'VAT':
-                            company_id_raw = InvoiceService._safe_get(
-                                tax_scheme,
-                                'cbc:CompanyID',
-                                'CompanyID',
-                                'companyID'
-                            )
-                            company_id = InvoiceService._extract_text_value(company_id_raw)
-                            if company_id:
-                                invoice_data['receiver_cif'] = company_id
-                                invoice_data['receiver_vat_id'] = company_id
-                                break
+                receiver_vat_id = InvoiceService._walk_party_vat_id(customer_party)
+                if receiver_vat_id:
+                    invoice_data['receiver_cif'] = receiver_vat_id
+                    invoice_data['receiver_vat_id'] = receiver_vat_id
             
             # Extract invoice date (BT-2)
-            issue_date_raw = InvoiceService._safe_get(
+            issue_date_raw = safe_get(
                 invoice_root,
                 'cbc:IssueDate',
                 'IssueDate',
                 'issueDate'
             )
-            issue_date = InvoiceService._extract_text_value(issue_date_raw)
+            issue_date = extract_text(issue_date_raw)
             if issue_date:
-                try:
-                    # Format: YYYY-MM-DD
-                    invoice_data['invoice_date'] = datetime.strptime(str(issue_date), '%Y-%m-%d').date()
-                except (ValueError, TypeError):
-                    pass
+                invoice_data['invoice_date'] = InvoiceService._parse_issue_date(str(issue_date))
             
             # Extract invoice number (BT-1)
-            invoice_data['invoice_number'] = InvoiceService._extract_text_value(
-                InvoiceService._safe_get(
+            invoice_data['invoice_number'] = extract_text(
+                safe_get(
                     invoice_root,
                     'cbc:ID',
                     'ID',
@@ -620,13 +858,13 @@ class InvoiceService:
             )
             
             # Extract currency code (BT-5)
-            currency_raw = InvoiceService._safe_get(
+            currency_raw = safe_get(
                 invoice_root,
                 'cbc:DocumentCurrencyCode',
                 'DocumentCurrencyCode',
                 'documentCurrencyCode'
             )
-            currency = InvoiceService._extract_text_value(currency_raw)
+            currency = extract_text(currency_raw)
             if currency:
                 invoice_data['currency'] = currency
             
@@ -648,7 +886,7 @@ class InvoiceService:
             ]
             
             for key in possible_keys:
-                legal_monetary_total = InvoiceService._safe_get(invoice_root, key, default=None)
+                legal_monetary_total = safe_get(invoice_root, key, default=None)
                 if legal_monetary_total:
                     break
             
@@ -706,10 +944,10 @@ class InvoiceService:
                         return None, currency_value
                     
                     # Extract amount value
-                    amount_text = InvoiceService._extract_text_value(amount_obj)
+                    amount_text = extract_text(amount_obj)
                     if amount_text:
                         try:
-                            amount_value = Decimal(str(amount_text))
+                            amount_value = Decimal(amount_text)
                         except (ValueError, TypeError, InvalidOperation):
                             pass
                 
@@ -724,7 +962,7 @@ class InvoiceService:
                 elif 'cbc:TaxInclusiveAmount' in legal_monetary_total:
                     tax_inclusive_obj = legal_monetary_total['cbc:TaxInclusiveAmount']
                 else:
-                    tax_inclusive_obj = InvoiceService._safe_get(
+                    tax_inclusive_obj = safe_get(
                         legal_monetary_total,
                         'TaxInclusiveAmount',
                         'taxInclusiveAmount',
@@ -749,7 +987,7 @@ class InvoiceService:
                 elif 'cbc:PayableAmount' in legal_monetary_total:
                     payable_amount_obj = legal_monetary_total['cbc:PayableAmount']
                 else:
-                    payable_amount_obj = InvoiceService._safe_get(
+                    payable_amount_obj = safe_get(
                         legal_monetary_total,
                         'PayableAmount',
                         'payableAmount',
@@ -776,7 +1014,7 @@ class InvoiceService:
                     elif 'cbc:TaxExclusiveAmount' in legal_monetary_total:
                         tax_exclusive_obj = legal_monetary_total['cbc:TaxExclusiveAmount']
                     else:
-                        tax_exclusive_obj = InvoiceService._safe_get(
+                        tax_exclusive_obj = safe_get(
                             legal_monetary_total,
                             'TaxExclusiveAmount',
                             'taxExclusiveAmount',
@@ -796,7 +1034,7 @@ class InvoiceService:
                 
                 # Also try LineExtensionAmount as fallback
                 if not invoice_data['total_amount']:
-                    line_ext_obj = InvoiceService._safe_get(
+                    line_ext_obj = safe_get(
                         legal_monetary_total,
                         'cbc:LineExtensionAmount',
                         'LineExtensionAmount',
@@ -813,7 +1051,8 @@ class InvoiceService:
             # Fallback pass: if amount is still missing or zero, try parsing without namespace processing
             if (not invoice_data['total_amount']) or (isinstance(invoice_data['total_amount'], Decimal) and invoice_data['total_amount'] == 0):
                 try:
-                    fb_dict = xmltodict.parse(xml_content)
+                    # Same parse options as above - reuse the tree instead of parsing again
+                    fb_dict = invoice_dict
                     # Try to locate LegalMonetaryTotal
                     lmt_fb = None
                     for key in ['cac:LegalMonetaryTotal', 'LegalMonetaryTotal', 'legalMonetaryTotal']:
@@ -868,42 +1107,36 @@ class InvoiceService:
             # If we still haven't found the amount, search recursively through the ENTIRE XML structure
             # (not just invoice_root, in case the structure is different)
             if not invoice_data['total_amount']:
-                def find_amount_recursive(obj, depth=0, max_depth=8, path=""):
-                    """Recursively search for amount fields with broader patterns"""
-                    if depth > max_depth or not isinstance(obj, dict):
-                        return None, None
-                    
-                    # Check current level for amount-like fields - expanded patterns
-                    for key, value in obj.items():
-                        if isinstance(key, str):
-                            key_lower = key.lower()
-                            current_path = f"{path}.{key}" if path else key
-                            
-                            # Look for amount fields - more patterns
-                            amount_patterns = [
-                                'payableamount', 'taxinclusiveamount', 'taxexclusiveamount',
-                                'totalamount', 'invoiceamount', 'amountdue', 'total',
-                                'suma', 'totalgeneral', 'valoare', 'amount', 'sum'
-                            ]
-                            
-                            if any(pattern in key_lower for pattern in amount_patterns):
-                                # Try to extract amount
-                                amount_val, curr_val = extract_amount_and_currency(value, key)
-                                if amount_val is not None and amount_val > 0:
-                                    return amount_val, curr_val
-                    
-                    # Recurse into nested structures
-                    for key, value in obj.items():
-                        if isinstance(value, dict):
-                            amount, curr = find_amount_recursive(value, depth + 1, max_depth, f"{path}.{key}" if path else key)
-                            if amount is not None:
-                                return amount, curr
-                        elif isinstance(value, list):
-                            for i, item in enumerate(value):
-                                if isinstance(item, dict):
-                                    amount, curr = find_amount_recursive(item, depth + 1, max_depth, f"{path}.{key}[{i}]" if path else f"{key}[{i}]")
-                                    if amount is not None:
-                                        return amount, curr
+                def find_amount_recursive(root, max_depth=8):
+                    """Search for amount fields with broader patterns, depth-first in document order"""
+                    # Explicit stack instead of recursion; children are pushed in
+                    # reverse so they pop in the same order the recursion visited them
+                    stack = [(root, 0)] if isinstance(root, dict) else []
+                    while stack:
+                        obj, depth = stack.pop()
+                        
+                        # Check current level for amount-like fields - expanded patterns
+                        for key, value in obj.items():
+                            if isinstance(key, str):
+                                key_lower = key.lower()
+                                # Look for amount fields - more patterns
+                                if any(pattern in key_lower for pattern in AMOUNT_KEY_PATTERNS):
+                                    # Try to extract amount
+                                    amount_val, curr_val = extract_amount_and_currency(value, key)
+                                    if amount_val is not None and amount_val > 0:
+                                        return amount_val, curr_val
+                        
+                        if depth >= max_depth:
+                            continue
+                        
+                        # Descend into nested structures
+                        children = []
+                        for value in obj.values():
+                            if isinstance(value, dict):
+                                children.append(value)
+                            elif isinstance(value, list):
+                                children.extend(item for item in value if isinstance(item, dict))
+                        stack.extend((child, depth + 1) for child in reversed(children))
                     
                     return None, None
                 
@@ -914,25 +1147,165 @@ class InvoiceService:
                 if curr_val and not invoice_data['currency']:
                     invoice_data['currency'] = curr_val
             
+            if isinstance(invoice_data['currency'], str):
+                invoice_data['currency'] = sys.intern(invoice_data['currency'])
+            if not include_raw:
+                del invoice_data['raw']
             return invoice_data
             
         except Exception as e:
             # Return minimal structure if parsing fails
-            return {
-                'raw': {},
-                'error': str(e),
-                'supplier_name': None,
-                'supplier_cif': None,
-                'issuer_name': None,
-                'receiver_name': None,
-                'receiver_cif': None,
-                'issuer_vat_id': None,
-                'receiver_vat_id': None,
-                'invoice_date': None,
-                'invoice_number': None,
-                'total_amount': None,
-                'currency': None
-            }
+            if not include_raw:
+                return {'error': str(e), **EMPTY_INVOICE_FIELDS}
+            return {'raw': {}, 'error': str(e), **EMPTY_INVOICE_FIELDS}
+    
+    @staticmethod
+    def _ubl_children(element, keys):
+        """
+        Children of element named in keys, by their xmltodict key ('cbc:ID')
+        
+        Returns None when xmltodict would build something the lxml line item
+        path can't mirror: a child outside the cac:/cbc: prefixes (the walk
+        also probes unprefixed names), a repeated key (a list in xmltodict) or
+        a cbc: element that isn't a plain text leaf.
+        """
+        children = {}
+        for child in element:
+            tag = child.tag
+            if not isinstance(tag, str):
+                # Comment or processing instruction
+                continue
+            prefix = child.prefix
+            if prefix != 'cac' and prefix != 'cbc':
+                return None
+            key = f"{prefix}:{tag[tag.index('}') + 1:]}"
+            if key in keys:
+                if key in children or (prefix == 'cbc' and len(child)):
+                    return None
+                children[key] = child
+        return children
+    
+    @staticmethod
+    def _ubl_leaf_text(element):
+        """_extract_text_value of the xmltodict value of a text-only element (or None)"""
+        if element is None:
+            return None
+        text = element.text
+        if text:
+            # xmltodict strips the text the same way
+            text = text.strip()
+            if text:
+                return text
+        # No text: xmltodict gives None, or a dict of the attributes
+        return element.get('text') or None
+    
+    @staticmethod
+    def _parse_ubl_line_items(xml_content):
+        """
+        Read the line items of a standard UBL Invoice with lxml
+        
+        Mirrors the xmltodict walk of extract_invoice_line_items, which finds
+        elements by their prefixed names ('cac:InvoiceLine', 'cbc:ID'). Returns
+        None - the caller then falls back to that walk - unless the invoice
+        has a default-namespace Invoice root and cac:/cbc: prefixed line items,
+        the layout ANAF invoices use and the one where both give the same result.
+        """
+        root = InvoiceService._parse_ubl_root(xml_content)
+        if root is None or root.prefix is not None:
+            return None
+        
+        lines = []
+        for child in root:
+            tag = child.tag
+            if isinstance(tag, str) and tag.rpartition('}')[2] == 'InvoiceLine':
+                if child.prefix != 'cac':
+                    return None
+                lines.append(child)
+        if not lines:
+            return None
+        
+        children = InvoiceService._ubl_children
+        leaf_text = InvoiceService._ubl_leaf_text
+        line_items = []
+        
+        for line in lines:
+            fields = children(line, UBL_LINE_KEYS)
+            if fields is None:
+                return None
+            
+            line_item = dict(EMPTY_LINE_ITEM_FIELDS)
+            line_item['line_id'] = leaf_text(fields.get('cbc:ID'))
+            
+            item = fields.get('cac:Item')
+            if item is not None:
+                item_fields = children(item, UBL_ITEM_KEYS)
+                if item_fields is None:
+                    return None
+                # Fallback to Description if Name is not available
+                line_item['item_name'] = (
+                    leaf_text(item_fields.get('cbc:Name'))
+                    or leaf_text(item_fields.get('cbc:Description'))
+                )
+                
+                tax_category = item_fields.get('cac:ClassifiedTaxCategory')
+                if tax_category is not None:
+                    tax_fields = children(tax_category, UBL_TAX_CATEGORY_KEYS)
+                    if tax_fields is None:
+                        return None
+                    vat_rate_text = leaf_text(tax_fields.get('cbc:Percent'))
+                    if vat_rate_text:
+                        try:
+                            line_item['vat_rate'] = float(vat_rate_text)
+                        except ValueError:
+                            pass
+                    line_item['vat_category'] = leaf_text(tax_fields.get('cbc:ID'))
+            
+            quantity = fields.get('cbc:InvoicedQuantity')
+            if quantity is not None:
+                line_item['unit_code'] = quantity.get('unitCode') or quantity.get('unitcode') or None
+                quantity_text = leaf_text(quantity)
+                if quantity_text:
+                    try:
+                        line_item['quantity'] = float(quantity_text)
+                    except ValueError:
+                        pass
+            
+            price = fields.get('cac:Price')
+            if price is not None:
+                price_fields = children(price, UBL_PRICE_KEYS)
+                if price_fields is None:
+                    return None
+                price_amount = price_fields.get('cbc:PriceAmount')
+                if price_amount is not None:
+                    currency_code = price_amount.get('currencyID') or price_amount.get('currencyid')
+                    if currency_code:
+                        line_item['currency'] = currency_code
+                    price_text = leaf_text(price_amount)
+                    if price_text:
+                        try:
+                            line_item['unit_price'] = float(price_text)
+                        except ValueError:
+                            pass
+            
+            line_total = fields.get('cbc:LineExtensionAmount')
+            if line_total is not None:
+                if not line_item['currency']:
+                    currency_code = line_total.get('currencyID') or line_total.get('currencyid')
+                    if currency_code:
+                        line_item['currency'] = currency_code
+                line_total_text = leaf_text(line_total)
+                if line_total_text:
+                    try:
+                        line_item['line_total'] = float(line_total_text)
+                    except ValueError:
+                        pass
+            
+            # Same rule as the xmltodict walk: any one field is enough
+            if (line_item['line_id'] or line_item['item_name'] or line_item['quantity'] is not None
+                    or line_item['unit_price'] is not None or line_item['line_total'] is not None):
+                line_items.append(line_item)
+        
+        return line_items
     
     @staticmethod
     def extract_invoice_line_items(xml_content):
@@ -955,54 +1328,58 @@ class InvoiceService:
             - vat_category: VAT category code (BT-150)
             - currency: Currency code
         """
+        # Fast path: standard UBL invoices are read directly with lxml
+        line_items = InvoiceService._parse_ubl_line_items(xml_content)
+        if line_items is not None:
+            debug_logger = _debug_logger()
+            if debug_logger:
+                debug_logger.debug(f"Extracted {len(line_items)} line items with lxml")
+            return line_items
+        
         try:
-            # Parse XML to ordered dict - try both with and without namespace processing
-            invoice_dict = None
-            invoice_root = None
+            def has_invoice_line(test_root):
+                """Check if InvoiceLine exists (with or without namespace)"""
+                return (
+                    'InvoiceLine' in test_root or 
+                    'cac:InvoiceLine' in test_root or
+                    any('InvoiceLine' in str(k) for k in test_root.keys())
+                )
             
-            # Try parsing with namespace processing first (strips namespace prefixes)
-            invoice_dict = None
+            # Parse XML to dict without namespace processing (keeps prefixes like cac:InvoiceLine)
             try:
-                invoice_dict = xmltodict.parse(xml_content, process_namespaces=True, namespaces={})
-            except:
-                pass
+                prefixed_dict = xmltodict.parse(xml_content)
+            except Exception:
+                # Return empty list if parsing fails completely
+                # (namespace processing only adds checks, it would fail too)
+                return []
             
-            # If that failed, try without namespace processing (keeps prefixes like cac:InvoiceLine)
-            if not invoice_dict:
+            prefixed_root = prefixed_dict.get('Invoice')
+            namespace = prefixed_root.get('@xmlns') if isinstance(prefixed_root, dict) else None
+            # A namespace URI containing 'InvoiceLine' (never the case for UBL) would
+            # make the namespaced parse below find lines under its root key
+            if namespace and 'InvoiceLine' not in namespace and has_invoice_line(prefixed_root):
+                # Default-namespace Invoice root with lines (the usual layout): a
+                # process_namespaces=True parse would file everything under the
+                # namespace URI and be discarded for this one anyway - skip it
+                invoice_dict = prefixed_dict
+            else:
+                # Try parsing with namespace processing (strips namespace prefixes)
+                invoice_dict = None
                 try:
-                    invoice_dict = xmltodict.parse(xml_content)
-                except Exception as e:
-                    # Return empty list if parsing fails completely
-                    return []
-            
-            # If we got a dict but it's empty or doesn't look right, try without namespace processing
-            # Sometimes process_namespaces=True doesn't work as expected
-            if invoice_dict and isinstance(invoice_dict, dict):
-                # Check if we can find InvoiceLine - if not, try parsing without namespace processing
-                test_root = invoice_dict.get('Invoice', invoice_dict)
-                if isinstance(test_root, dict):
-                    # Check if InvoiceLine exists (with or without namespace)
-                    has_invoice_line = (
-                        'InvoiceLine' in test_root or 
-                        'cac:InvoiceLine' in test_root or
-                        any('InvoiceLine' in str(k) for k in test_root.keys())
-                    )
-                    # If InvoiceLine not found and we used process_namespaces=True, try without it
-                    if not has_invoice_line:
-                        try:
-                            invoice_dict_no_ns = xmltodict.parse(xml_content)
-                            # Verify this version has InvoiceLine
-                            test_root_no_ns = invoice_dict_no_ns.get('Invoice', invoice_dict_no_ns)
-                            if isinstance(test_root_no_ns, dict):
-                                has_invoice_line_no_ns = (
-                                    'InvoiceLine' in test_root_no_ns or 
-                                    'cac:InvoiceLine' in test_root_no_ns or
-                                    any('InvoiceLine' in str(k) for k in test_root_no_ns.keys())
-                                )
-                                if has_invoice_line_no_ns:
-                                    invoice_dict = invoice_dict_no_ns
-                        except:
-                            pass  # Keep the original parse result
+                    invoice_dict = xmltodict.parse(xml_content, process_namespaces=True, namespaces={})
+                except Exception:
+                    pass
+                
+                if not invoice_dict:
+                    invoice_dict = prefixed_dict
+                else:
+                    # Sometimes process_namespaces=True doesn't work as expected:
+                    # if InvoiceLine isn't found, use the prefixed parse when it has them
+                    test_root = invoice_dict.get('Invoice', invoice_dict)
+                    if isinstance(test_root, dict) and not has_invoice_line(test_root):
+                        test_root_no_ns = prefixed_dict.get('Invoice', prefixed_dict)
+                        if isinstance(test_root_no_ns, dict) and has_invoice_line(test_root_no_ns):
+                            invoice_dict = prefixed_dict
             
             # Find Invoice root element (same logic as parse_xml_to_json)
             # xmltodict with process_namespaces=True might create keys with full namespace URIs
@@ -1080,43 +1457,46 @@ class InvoiceService:
             
             # Method 2: If not found, search recursively for InvoiceLine
             if not invoice_lines_raw:
-                def find_invoice_lines(obj, depth=0, max_depth=5):
-                    """Recursively search for InvoiceLine elements"""
-                    if depth > max_depth:
-                        return None
-                    
-                    if not isinstance(obj, dict):
-                        return None
-                    
-                    # Check current level for InvoiceLine (case-insensitive)
-                    for key in obj.keys():
-                        if isinstance(key, str):
-                            key_lower = key.lower()
-                            # Look for InvoiceLine (but not InvoiceLineReference or similar)
-                            if key_lower == 'invoiceline' or (key_lower.endswith(':invoiceline') and 'reference' not in key_lower):
-                                result = obj[key]
-                                if result:  # Only return if not None/empty
-                                    return result
-                    
-                    # Recurse into nested dicts
-                    for key, value in obj.items():
-                        if isinstance(value, dict):
-                            result = find_invoice_lines(value, depth + 1, max_depth)
-                            if result:
-                                return result
-                        elif isinstance(value, list):
-                            # Check if list contains InvoiceLine dicts
-                            if value and isinstance(value[0], dict):
-                                # Check first item's keys to see if it looks like InvoiceLine
-                                first_keys = list(value[0].keys())
-                                if any('id' in k.lower() and ('item' in k.lower() or 'quantity' in k.lower() or 'price' in k.lower()) for k in first_keys):
-                                    return value
-                            # Otherwise recurse into list items
-                            for item in value:
-                                if isinstance(item, dict):
-                                    result = find_invoice_lines(item, depth + 1, max_depth)
-                                    if result:
+                def find_invoice_lines(root, max_depth=5):
+                    """Search for InvoiceLine elements, depth-first in document order"""
+                    # Explicit stack instead of recursion. Entries are (dict, depth) to
+                    # search, or (list, None) to test as a whole; they are pushed in
+                    # reverse so they pop in the order the recursion visited them.
+                    stack = [(root, 0)]
+                    while stack:
+                        obj, depth = stack.pop()
+                        
+                        if depth is None:
+                            # Check first item's keys to see if it looks like InvoiceLine
+                            first_keys = list(obj[0].keys())
+                            if any('id' in k.lower() and ('item' in k.lower() or 'quantity' in k.lower() or 'price' in k.lower()) for k in first_keys):
+                                return obj
+                            continue
+                        
+                        if depth > max_depth or not isinstance(obj, dict):
+                            continue
+                        
+                        # Check current level for InvoiceLine (case-insensitive)
+                        for key in obj.keys():
+                            if isinstance(key, str):
+                                key_lower = key.lower()
+                                # Look for InvoiceLine (but not InvoiceLineReference or similar)
+                                if key_lower == 'invoiceline' or (key_lower.endswith(':invoiceline') and 'reference' not in key_lower):
+                                    result = obj[key]
+                                    if result:  # Only return if not None/empty
                                         return result
+                        
+                        # Then nested dicts, and lists: as a whole first, then their items
+                        pending = []
+                        for value in obj.values():
+                            if isinstance(value, dict):
+                                pending.append((value, depth + 1))
+                            elif isinstance(value, list):
+                                if value and isinstance(value[0], dict):
+                                    pending.append((value, None))
+                                pending.extend((item, depth + 1) for item in value if isinstance(item, dict))
+                        stack.extend(reversed(pending))
+                    
                     return None
                 
                 invoice_lines_raw = find_invoice_lines(invoice_root)
@@ -1172,17 +1552,7 @@ class InvoiceService:
                 if not isinstance(line, dict):
                     continue
                 
-                line_item = {
-                    'line_id': None,
-                    'item_name': None,
-                    'quantity': None,
-                    'unit_code': None,
-                    'unit_price': None,
-                    'line_total': None,
-                    'vat_rate': None,
-                    'vat_category': None,
-                    'currency': None
-                }
+                line_item = dict(EMPTY_LINE_ITEM_FIELDS)
                 
                 # Extract line ID (BT-126) - cbc:ID becomes ID when process_namespaces=True
                 # Try direct access first (faster)
@@ -1447,17 +1817,11 @@ class InvoiceService:
         Returns:
             Tuple of (supplier_name, supplier_cif, invoice_date, total_amount, currency, issuer_name, receiver_name, issuer_vat_id, receiver_vat_id)
         """
-        supplier_name = parsed_data.get('supplier_name')
-        supplier_cif = parsed_data.get('supplier_cif')
-        invoice_date = parsed_data.get('invoice_date')
-        total_amount = parsed_data.get('total_amount')
-        currency = parsed_data.get('currency')
-        issuer_name = parsed_data.get('issuer_name')
-        receiver_name = parsed_data.get('receiver_name')
-        issuer_vat_id = parsed_data.get('issuer_vat_id')
-        receiver_vat_id = parsed_data.get('receiver_vat_id')
-        
-        return supplier_name, supplier_cif, invoice_date, total_amount, currency, issuer_name, receiver_name, issuer_vat_id, receiver_vat_id
+        try:
+            # parse_xml_to_json always fills in every field: one C-level lookup of all nine
+            return _get_invoice_fields(parsed_data)
+        except KeyError:
+            return tuple(parsed_data.get(field) for field in INVOICE_FIELD_ORDER)
     
     @staticmethod
     def _is_empty_or_dash(value):
@@ -1552,7 +1916,7 @@ class InvoiceService:
         
         try:
             # Parse XML content (should now be unsigned XML)
-            parsed_data = InvoiceService.parse_xml_to_json(xml_content_to_parse)
+            parsed_data = InvoiceService.parse_xml_to_json(xml_content_to_parse, include_raw=False)
             
             # Extract all fields
             supplier_name, supplier_cif, invoice_date, total_amount, currency, \
@@ -214,6 +214,10 @@ class OAuthService:
             
             db.session.commit()
             
+            # Stop this process from sending the old token
+            from app.services.anaf_service import ANAFService
+            ANAFService.invalidate_token(self.user_id)
+            
             # Verify token was stored correctly
             db.session.refresh(anaf_token)
             stored_length = len(anaf_token.access_token) if anaf_token.access_token else 0
@@ -276,6 +280,9 @@ class OAuthService:
             anaf_token.updated_at = datetime.now(timezone.utc)
             
             db.session.commit()
+            # Stop this process from sending the old token
+            from app.services.anaf_service import ANAFService
+            ANAFService.invalidate_token(self.user_id)
             return token_data
             
         except requests.exceptions.RequestException as e:
@@ -340,6 +347,9 @@ class OAuthService:
             db.session.delete(anaf_token)
             db.session.commit()
             
+            from app.services.anaf_service import ANAFService
+            ANAFService.invalidate_token(self.user_id)
+            
             return True
         except requests.exceptions.RequestException as e:
             current_app.logger.error(f"Token revocation failed: {str(e)}")
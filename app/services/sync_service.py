@@ -6,6 +6,7 @@ from flask import current_app
 import zipfile
 import io
 import re
+import logging
 from app.models import db, Company, Invoice, AnafToken
 from app.services.anaf_service import ANAFService
 from app.services.invoice_service import InvoiceService
@@ -14,6 +15,9 @@ from app.services.storage_service import InvoiceStorageService
 scheduler = None
 app_instance = None  # Store app instance for scheduler context
 
+# Number of new invoices downloaded concurrently ahead of the processing loop
+SYNC_DOWNLOAD_BATCH_SIZE = 32
+
 def _calculate_sync_days(company_id):
     """
     Calculate the number of days to sync based on the last sync date.
@@ -267,10 +271,12 @@ def _sync_company_invoices_impl(company_id, force=False):
         sys.stderr.flush()
         
         if isinstance(invoice_list, dict):
-            current_app.logger.info(f"Invoice list keys: {invoice_list.keys()}")
-            current_app.logger.info(f"Invoice list (first 300 chars): {str(invoice_list)[:300]}")
+            current_app.logger.info("Invoice list keys: %s", list(invoice_list.keys()))
             print(f"[SYNC_IMPL] Invoice list keys: {list(invoice_list.keys())}", file=sys.stderr)
-            print(f"[SYNC_IMPL] Full API response: {invoice_list}", file=sys.stderr)
+            # Stringifying the listing walks every message - only do it when debugging
+            if current_app.logger.isEnabledFor(logging.DEBUG):
+                current_app.logger.debug("Invoice list (first 300 chars): %s", str(invoice_list)[:300])
+                print(f"[SYNC_IMPL] Full API response: {invoice_list}", file=sys.stderr)
             sys.stderr.flush()
         else:
             current_app.logger.info(f"Invoice list length: {len(invoice_list) if isinstance(invoice_list, list) else 'N/A'}")
@@ -328,10 +334,40 @@ def _sync_company_invoices_impl(company_id, force=False):
         print(f"[SYNC_IMPL] Step 16: About to process {len(invoices_data)} invoices", file=sys.stderr)
         sys.stderr.flush()
         
+        # Download new invoices concurrently, one window at a time, ahead of the loop below
+        existing_anaf_ids = {
+            anaf_id for (anaf_id,) in db.session.query(Invoice.anaf_id).filter_by(company_id=company.id)
+        }
+        new_invoice_ids = []
+        for invoice_item in invoices_data:
+            if isinstance(invoice_item, dict):
+                message_id = invoice_item.get('id') or invoice_item.get('ID')
+            else:
+                message_id = invoice_item if isinstance(invoice_item, str) else None
+            if message_id and str(message_id) not in existing_anaf_ids:
+                new_invoice_ids.append(str(message_id))
+        new_invoice_positions = {message_id: pos for pos, message_id in enumerate(new_invoice_ids)}
+        prefetched_downloads = {}
+        
+        def download_invoice_file(message_id):
+            message_id = str(message_id)
+            if message_id not in prefetched_downloads and message_id in new_invoice_positions:
+                start = new_invoice_positions[message_id]
+                prefetched_downloads.update(anaf_service.descarcare_factura_batch(
+                    new_invoice_ids[start:start + SYNC_DOWNLOAD_BATCH_SIZE]
+                ))
+            content = prefetched_downloads.pop(message_id, None)
+            if content is None:
+                return anaf_service.descarcare_factura(message_id)
+            if isinstance(content, Exception):
+                raise content
+            return content
+        
         synced_count = 0
         for invoice_item in invoices_data:
-            print(f"[SYNC_IMPL] Processing invoice item: {invoice_item}", file=sys.stderr)
-            sys.stderr.flush()
+            if current_app.logger.isEnabledFor(logging.DEBUG):
+                print(f"[SYNC_IMPL] Processing invoice item: {invoice_item}", file=sys.stderr)
+                sys.stderr.flush()
             try:
                 # Extract message data per ANAF documentation structure
                 # Message structure: {"data_creare": "...", "cif": "", "id_solicitare": "", 
@@ -374,7 +410,8 @@ def _sync_company_invoices_impl(company_id, force=False):
                         if beneficiar_match:
                             cif_beneficiar = beneficiar_match.group(1)
                         
-                    current_app.logger.info(f"Extracted CIFs from detalii - Emitent: {cif_emitent}, Beneficiar: {cif_beneficiar}")
+                    # Both CIFs are repeated in the "Processing message ID" line below
+                    current_app.logger.debug("Extracted CIFs from detalii - Emitent: %s, Beneficiar: %s", cif_emitent, cif_beneficiar)
                     if not cif_emitent or not cif_beneficiar:
                         current_app.logger.warning(f"Could not extract CIFs from detalii: {detalii}")
                 elif isinstance(invoice_item, str):
@@ -384,7 +421,10 @@ def _sync_company_invoices_impl(company_id, force=False):
                     current_app.logger.warning(f"Skipping invoice item without ID: {invoice_item}")
                     continue
                 
-                current_app.logger.info(f"Processing message ID: {invoice_id}, Type: {invoice_type}, Date: {data_creare}, CIF Emitent: {cif_emitent}, CIF Beneficiar: {cif_beneficiar}")
+                current_app.logger.info(
+                    "Processing message ID: %s, Type: %s, Date: %s, CIF Emitent: %s, CIF Beneficiar: %s",
+                    invoice_id, invoice_type, data_creare, cif_emitent, cif_beneficiar
+                )
                 
                 # Check if invoice already exists
                 existing = Invoice.query.filter_by(
@@ -431,7 +471,8 @@ def _sync_company_invoices_impl(company_id, force=False):
                                 xml_content = None
                             
                             if xml_content:
-                                parsed_data = invoice_service.parse_xml_to_json(xml_content)
+                                # Only the extracted fields are used here, json_content is left as is
+                                parsed_data = invoice_service.parse_xml_to_json(xml_content, include_raw=False)
                                 supplier_name, supplier_cif, invoice_date_from_xml, total_amount, currency, \
                                 issuer_name, receiver_name, issuer_vat_id, receiver_vat_id = \
                                     invoice_service.extract_invoice_fields(parsed_data)
@@ -494,7 +535,7 @@ def _sync_company_invoices_impl(company_id, force=False):
                 
                 # Download invoice file (binary - ZIP or XML)
                 try:
-                    file_content = anaf_service.descarcare_factura(invoice_id)
+                    file_content = download_invoice_file(invoice_id)
                 
                     # Handle binary content - could be ZIP or XML
                     # Check if file_content is empty
@@ -632,10 +673,12 @@ def _sync_company_invoices_impl(company_id, force=False):
             current_app.logger.error(f"Error committing invoice batch: {str(commit_error)}", exc_info=True)
             db.session.rollback()
             raise
-        current_app.logger.info(f"=== SYNC COMPLETE FOR COMPANY {company_id} ===")
-        current_app.logger.info(f"Sync type: {sync_type}, Days synced: {sync_days}")
-        current_app.logger.info(f"Successfully synced {synced_count} new invoices for company {company_id} ({company.name})")
-        current_app.logger.info("=" * 60)
+        # One multi-line record instead of four separate writes
+        current_app.logger.info(
+            "=== SYNC COMPLETE FOR COMPANY %s ===\nSync type: %s, Days synced: %s\n"
+            "Successfully synced %s new invoices for company %s (%s)\n%s",
+            company_id, sync_type, sync_days, synced_count, company_id, company.name, "=" * 60
+        )
         
     except Exception as e:
         db.session.rollback()
@@ -1,8 +1,10 @@
 """Helper functions for user impersonation feature"""
-from flask import session
+from flask import session, g
 from flask_login import current_user
 from app.models import User
 
+_NOT_LOADED = object()
+
 
 def is_impersonating():
     """Check if current session is impersonating another user"""
@@ -10,10 +12,23 @@ def is_impersonating():
 
 
 def get_original_admin():
-    """Get the original admin user object who initiated impersonation"""
+    """Get the original admin user object who initiated impersonation
+    
+    The lookup is cached on flask.g so templates and views can call this
+    repeatedly within a request without re-querying the User.
+    """
     if not is_impersonating():
         return None
     
+    original_admin = g.get('_original_admin', _NOT_LOADED)
+    if original_admin is _NOT_LOADED:
+        original_admin = _load_original_admin()
+        g._original_admin = original_admin
+    return original_admin
+
+
+def _load_original_admin():
+    """Query the original admin user from the impersonation session data"""
     admin_id = session.get('_impersonating_from_user_id')
     if admin_id:
         try:
@@ -23,6 +38,17 @@ def get_original_admin():
     return None
 
 
+def get_acting_admin():
+    """Get the user whose admin rights apply to this request
+    
+    Returns the original admin when impersonating, otherwise current_user.
+    """
+    if is_impersonating():
+        return get_original_admin()
+    # Unwrap the proxy so the result keeps pointing at this user after login_user()
+    return current_user._get_current_object()
+
+
 def get_impersonated_user():
     """Get the currently impersonated user object"""
     if not is_impersonating():
@@ -16,6 +16,13 @@ class Config:
     # Documentation: https://mfinante.gov.ro/static/10/eFactura/prezentare%20api%20efactura.pdf
     ANAF_API_BASE_URL = os.environ.get('ANAF_API_BASE_URL') or 'https://api.anaf.ro'
     
+    # ANAF has no company discovery endpoint; companies are added manually.
+    # Set to 'true' only if a discovery endpoint becomes available.
+    ANAF_HAS_COMPANY_DISCOVERY = os.environ.get('ANAF_HAS_COMPANY_DISCOVERY', 'false').lower() == 'true'
+    
+    # Max keep-alive connections kept open to ANAF by the shared HTTP session
+    ANAF_POOL_MAXSIZE = int(os.environ.get('ANAF_POOL_MAXSIZE', 32))
+    
     # Session configuration
     SESSION_COOKIE_SECURE = os.environ.get('FLASK_ENV') == 'production'
     SESSION_COOKIE_HTTPONLY = True
@@ -0,0 +1,32 @@
+"""Add partial index on pending users
+
+Revision ID: b7e2d4f6a8c1
+Revises: fcf06a614aaa
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2d4f6a8c1'
+down_revision = 'fcf06a614aaa'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Partial index: only rows still waiting for approval are indexed, so it stays
+    # tiny and serves the pending-users count on the admin page
+    op.create_index(
+        'ix_users_pending',
+        'users',
+        ['id'],
+        unique=False,
+        postgresql_where=sa.text('is_approved = false')
+    )
+
+
+def downgrade():
+    op.drop_index('ix_users_pending', table_name='users')
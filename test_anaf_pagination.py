@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""Check listaMesajePaginatieFactura pagination against a stubbed ANAF session"""
+
+import sys
+import os
+import io
+import json
+import time
+import random
+import base64
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+from flask import Flask
+from app.models import db
+from app.services.anaf_service import ANAFService
+
+PER_PAGE = 10
+
+
+def make_token():
+    """Unsigned JWT with an `exp` far in the future (so it gets cached)"""
+    payload = base64.urlsafe_b64encode(json.dumps({'exp': 4102444800}).encode()).decode().rstrip('=')
+    return f"eyJhbGciOiJub25lIn0.{payload}.sig"
+
+
+class StubSession:
+    """
+    Serves listing pages of PER_PAGE messages numbered from 0
+
+    metadata: 'pages' (numar_total_pagini), 'records' (record count and page
+    size only) or None (no page count at all). Pages in fail_pages answer
+    HTTP 500, pages in empty_pages answer with the end-of-pages error.
+    """
+
+    def __init__(self, total_pages, metadata='pages', fail_pages=(), empty_pages=()):
+        self.total_pages = total_pages
+        self.metadata = metadata
+        self.fail_pages = set(fail_pages)
+        self.empty_pages = set(empty_pages)
+        self.lock = threading.Lock()
+        self.pages = []
+
+    def get(self, url, params=None, headers=None, **kwargs):
+        pagina = params['pagina']
+        with self.lock:
+            self.pages.append(pagina)
+        # Finish pages out of order so ordering bugs show up
+        time.sleep(random.uniform(0, 0.02))
+
+        response = requests.Response()
+        response.url = url
+        response.status_code = 200
+        if pagina in self.fail_pages:
+            response.status_code = 500
+            body = {'eroare': 'Internal error'}
+        elif pagina > self.total_pages or pagina in self.empty_pages:
+            body = {'eroare': f'Pagina solicitata {pagina} este mai mare decat numarul toatal de pagini {self.total_pages}'}
+        else:
+            first = (pagina - 1) * PER_PAGE
+            body = {
+                'mesaje': [{'id': str(first + i)} for i in range(PER_PAGE)],
+                'serial': 'serial', 'cui': '123', 'titlu': 'Lista Mesaje'
+            }
+            if self.metadata == 'pages':
+                body['numar_total_pagini'] = self.total_pages
+            elif self.metadata == 'records':
+                body['numar_total_inregistrari'] = self.total_pages * PER_PAGE
+                body['numar_total_inregistrari_per_pagina'] = PER_PAGE
+        response._content = json.dumps(body).encode()
+        response.raw = io.BytesIO(response._content)
+        return response
+
+
+def listing_ids(result):
+    return [int(message['id']) for message in result['mesaje']]
+
+
+app = Flask(__name__)
+app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+db.init_app(app)
+
+failed = False
+
+
+def check(label, condition, detail=''):
+    global failed
+    print(f"{'✓' if condition else '✗'} {label}{': ' + detail if detail else ''}")
+    failed = failed or not condition
+
+
+with app.app_context():
+    db.create_all()
+
+    print("="*80)
+    print("Testing listaMesajePaginatieFactura pagination")
+    print("="*80)
+
+    service = ANAFService(user_id=1)
+    service.oauth_service.get_valid_token = make_token
+
+    # 1. Page count reported: pages 2..N fetched concurrently, results in page order
+    for metadata in ('pages', 'records'):
+        service.session = StubSession(total_pages=7, metadata=metadata)
+        result = service._lista_mesaje_paginated('123', 5, max_workers=4)
+        check(f"[{metadata}] messages in page order", listing_ids(result) == list(range(70)))
+        check(f"[{metadata}] only pages 1..7 fetched", sorted(service.session.pages) == list(range(1, 8)),
+              str(sorted(service.session.pages)))
+        check(f"[{metadata}] metadata from page 1", result['serial'] == 'serial' and result['cui'] == '123')
+
+    # 2. No page count: doubling waves until the first empty page
+    service.session = StubSession(total_pages=6, metadata=None)
+    result = service._lista_mesaje_paginated('123', 5, max_workers=4)
+    check("[waves] messages in page order", listing_ids(result) == list(range(60)))
+    check("[waves] stopped after the first empty page", max(service.session.pages) <= 6 + 4,
+          str(sorted(service.session.pages)))
+
+    # 3. Early stop: an empty page before the reported end ends the listing
+    service.session = StubSession(total_pages=8, empty_pages={3})
+    result = service._lista_mesaje_paginated('123', 5, max_workers=1)
+    check("[early stop] messages of pages 1-2 only", listing_ids(result) == list(range(20)))
+    check("[early stop] queued pages cancelled", len(service.session.pages) < 8, str(sorted(service.session.pages)))
+
+    # 4. Failed page: the error is raised and the queued pages are not fetched
+    service.session = StubSession(total_pages=20, fail_pages={3})
+    try:
+        service._lista_mesaje_paginated('123', 5, max_workers=1)
+        check("[failed page] HTTPError raised", False, 'no exception')
+    except requests.exceptions.HTTPError as e:
+        check("[failed page] HTTPError raised", e.response.status_code == 500)
+    check("[failed page] queued pages cancelled", len(service.session.pages) < 20, str(sorted(service.session.pages)))
+
+    # 5. Page count derivation
+    check("[total pages] numar_total_pagini", ANAFService._lista_total_pages({'numar_total_pagini': '4'}) == 4)
+    check("[total pages] rounded up from records",
+          ANAFService._lista_total_pages({'numar_total_inregistrari': 21, 'numar_total_inregistrari_per_pagina': 10}) == 3)
+    check("[total pages] absent", ANAFService._lista_total_pages({'mesaje': []}) is None)
+    check("[total pages] zero page size",
+          ANAFService._lista_total_pages({'numar_total_inregistrari': 5, 'numar_total_inregistrari_per_pagina': 0}) is None)
+
+    print("="*80)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Check that concurrent HTTP 401s during a batch download trigger a single token refresh"""
+
+import sys
+import os
+import io
+import json
+import base64
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+from flask import Flask
+from app.models import db
+from app.services.anaf_service import ANAFService
+
+
+def make_token(tag):
+    """Unsigned JWT with an `exp` far in the future (so it gets cached)"""
+    payload = base64.urlsafe_b64encode(json.dumps({'exp': 4102444800, 'tag': tag}).encode()).decode().rstrip('=')
+    return f"eyJhbGciOiJub25lIn0.{payload}.{tag}"
+
+
+OLD_TOKEN = make_token('old')
+NEW_TOKEN = make_token('new')
+WORKERS = 2
+
+
+class StubSession:
+    """Stands in for the shared requests session: rejects OLD_TOKEN with 401"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = []
+        # Hold the workers until all of them sent the old token, so the 401s overlap
+        self.barrier = threading.Barrier(WORKERS, timeout=5)
+
+    def get(self, url, params=None, headers=None, **kwargs):
+        with self.lock:
+            self.calls.append(headers['Authorization'])
+        response = requests.Response()
+        response.url = url
+        if headers['Authorization'] == f'Bearer {OLD_TOKEN}':
+            self.barrier.wait()
+            response.status_code = 401
+            response._content = b'{"error": "unauthorized"}'
+        else:
+            response.status_code = 200
+            response._content = b'PK\x03\x04' + str(params['id']).encode()
+        response.raw = io.BytesIO(response._content)
+        return response
+
+
+app = Flask(__name__)
+app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+db.init_app(app)
+
+with app.app_context():
+    db.create_all()
+
+    print("="*80)
+    print("Testing token refresh after concurrent 401s")
+    print("="*80)
+
+    service = ANAFService(user_id=1)
+    service.session = StubSession()
+    ANAFService.invalidate_token(1)
+
+    token_loads = []
+
+    def get_valid_token():
+        # First load hands out the token ANAF is about to reject, later ones "refresh"
+        token_loads.append(threading.current_thread().name)
+        return OLD_TOKEN if len(token_loads) == 1 else NEW_TOKEN
+
+    service.oauth_service.get_valid_token = get_valid_token
+
+    results = service.descarcare_factura_batch(['1', '2'], max_workers=WORKERS)
+
+    failed = False
+    for message_id, content in results.items():
+        if isinstance(content, bytes):
+            print(f"✓ download {message_id}: {content!r}")
+        else:
+            print(f"✗ download {message_id}: {content!r}")
+            failed = True
+
+    rejected = service.session.calls.count(f'Bearer {OLD_TOKEN}')
+    refreshes = len(token_loads) - 1
+    print(f"{'✓' if rejected == WORKERS else '✗'} 401 responses: {rejected} (expected {WORKERS})")
+    print(f"{'✓' if refreshes == 1 else '✗'} token refreshes: {refreshes} (expected 1)")
+    failed = failed or rejected != WORKERS or refreshes != 1
+
+    print("="*80)
+    sys.exit(1 if failed else 0)
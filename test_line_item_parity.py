@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Check that the lxml line item path and the xmltodict fallback extract the same line items"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+from app.services import invoice_service
+from app.services.invoice_service import InvoiceService
+
+LINE = """
+    <cac:InvoiceLine>
+        <cbc:ID>{id}</cbc:ID>
+        <cbc:InvoicedQuantity unitCode="{unit}">{quantity}</cbc:InvoicedQuantity>
+        <cbc:LineExtensionAmount currencyID="RON">{total}</cbc:LineExtensionAmount>
+        <cac:Item>
+            <cbc:Description>Description {id}</cbc:Description>
+            <cbc:Name>{name}</cbc:Name>
+            <cac:ClassifiedTaxCategory>
+                <cbc:ID>S</cbc:ID>
+                <cbc:Percent>{vat}</cbc:Percent>
+                <cac:TaxScheme><cbc:ID>VAT</cbc:ID></cac:TaxScheme>
+            </cac:ClassifiedTaxCategory>
+        </cac:Item>
+        <cac:Price><cbc:PriceAmount currencyID="RON">{price}</cbc:PriceAmount></cac:Price>
+    </cac:InvoiceLine>"""
+
+INVOICE = """<?xml version="1.0" encoding="UTF-8"?>
+<Invoice xmlns="urn:oasis:names:specification:ubl:schema:xsd:Invoice-2"
+         xmlns:cac="urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2"
+         xmlns:cbc="urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2">
+    <cbc:ID>INV-1</cbc:ID>
+    <cbc:IssueDate>2025-11-27</cbc:IssueDate>
+    <cbc:DocumentCurrencyCode>RON</cbc:DocumentCurrencyCode>
+    <cac:LegalMonetaryTotal>
+        <cbc:PayableAmount currencyID="RON">119.00</cbc:PayableAmount>
+    </cac:LegalMonetaryTotal>{lines}
+</Invoice>
+"""
+
+
+def line(id, name='Item', quantity='2', unit='H87', total='10.00', price='5.00', vat='19'):
+    return LINE.format(id=id, name=name, quantity=quantity, unit=unit, total=total, price=price, vat=vat)
+
+
+SAMPLES = {
+    'single line': INVOICE.format(lines=line(1)),
+    'several lines': INVOICE.format(lines=''.join(line(i, name=f'Item {i}', total=f'{i}0.00') for i in range(1, 6))),
+    'escaped name': INVOICE.format(lines=line(1, name='Nuts &amp; bolts &lt;M8&gt;')),
+    'decimal quantity': INVOICE.format(lines=line(1, quantity='1.500', unit='KGM', price='3.3333')),
+    'no VAT percent': INVOICE.format(lines=line(1, vat='')),
+    'whitespace': INVOICE.format(lines=line(1, name='  Padded item  ', quantity=' 3 ')),
+}
+
+app = Flask(__name__)
+
+with app.app_context():
+    print("="*80)
+    print("Testing line item parity: lxml path vs xmltodict fallback")
+    print("="*80)
+
+    if invoice_service.etree is None:
+        print("✗ lxml is not installed, nothing to compare")
+        sys.exit(1)
+
+    failed = False
+    for label, xml_content in SAMPLES.items():
+        lxml_items = InvoiceService.extract_invoice_line_items(xml_content)
+
+        # Without lxml, extract_invoice_line_items takes the xmltodict fallback
+        lxml_module = invoice_service.etree
+        invoice_service.etree = None
+        try:
+            fallback_items = InvoiceService.extract_invoice_line_items(xml_content)
+        finally:
+            invoice_service.etree = lxml_module
+
+        if lxml_items == fallback_items and lxml_items:
+            print(f"✓ {label}: {len(lxml_items)} line(s) match")
+        else:
+            print(f"✗ {label}:")
+            print(f"    lxml:     {lxml_items}")
+            print(f"    fallback: {fallback_items}")
+            failed = True
+
+    print("="*80)
+    sys.exit(1 if failed else 0)
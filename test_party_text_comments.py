@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Regression check: party name and VAT ID must survive XML comments inside the element"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+from app.services.invoice_service import InvoiceService
+
+XML = """<?xml version="1.0" encoding="UTF-8"?>
+<Invoice xmlns="urn:oasis:names:specification:ubl:schema:xsd:Invoice-2"
+         xmlns:cac="urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2"
+         xmlns:cbc="urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2">
+    <cbc:ID>INV-1</cbc:ID>
+    <cbc:IssueDate>2025-11-27</cbc:IssueDate>
+    <cbc:DocumentCurrencyCode>RON</cbc:DocumentCurrencyCode>
+    <cac:AccountingSupplierParty>
+        <cac:Party>
+            <cac:PartyTaxScheme>
+                <cbc:CompanyID>RO<!-- split -->12345</cbc:CompanyID>
+                <cac:TaxScheme><cbc:ID>VAT</cbc:ID></cac:TaxScheme>
+            </cac:PartyTaxScheme>
+            <cac:PartyLegalEntity>
+                <cbc:RegistrationName>Alpha &amp; <!-- comment -->Beta SRL</cbc:RegistrationName>
+            </cac:PartyLegalEntity>
+        </cac:Party>
+    </cac:AccountingSupplierParty>
+    <cac:AccountingCustomerParty>
+        <cac:Party>
+            <cac:PartyLegalEntity>
+                <cbc:RegistrationName>Gamma<?pi note?> SA</cbc:RegistrationName>
+            </cac:PartyLegalEntity>
+        </cac:Party>
+    </cac:AccountingCustomerParty>
+    <cac:LegalMonetaryTotal>
+        <cbc:PayableAmount currencyID="RON">119.07</cbc:PayableAmount>
+    </cac:LegalMonetaryTotal>
+</Invoice>
+"""
+
+EXPECTED = {
+    'supplier_name': 'Alpha & Beta SRL',
+    'issuer_name': 'Alpha & Beta SRL',
+    'supplier_cif': 'RO12345',
+    'issuer_vat_id': 'RO12345',
+    'receiver_name': 'Gamma SA',
+}
+
+# Parsing only needs current_app for logging, not the database
+app = Flask(__name__)
+
+with app.app_context():
+    print("="*80)
+    print("Testing party name / VAT ID extraction with comments inside the text")
+    print("="*80)
+
+    parsed = InvoiceService.parse_xml_to_json(XML, include_raw=False)
+
+    failed = False
+    for field, expected in EXPECTED.items():
+        value = parsed.get(field)
+        if value == expected:
+            print(f"✓ {field}: {value!r}")
+        else:
+            print(f"✗ {field}: {value!r} (expected {expected!r})")
+            failed = True
+
+    print("="*80)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Check the user approval/rejection endpoints (single and bulk) against an in-memory database"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+from flask_login import LoginManager, FlaskLoginClient
+from app.models import db, User, Company
+from app.routes.users import users_bp
+
+app = Flask(__name__)
+app.config.update(
+    SECRET_KEY='test',
+    SQLALCHEMY_DATABASE_URI='sqlite://',
+)
+app.test_client_class = FlaskLoginClient
+db.init_app(app)
+login_manager = LoginManager(app)
+login_manager.user_loader(lambda user_id: db.session.get(User, int(user_id)))
+app.register_blueprint(users_bp)
+
+JSON_HEADERS = {'X-Requested-With': 'XMLHttpRequest', 'Accept': 'application/json'}
+
+failed = False
+
+
+def check(label, condition, detail=''):
+    global failed
+    print(f"{'✓' if condition else '✗'} {label}{': ' + detail if detail else ''}")
+    failed = failed or not condition
+
+
+def add_user(email, is_admin=False, is_approved=False):
+    user = User(email=email, is_admin=is_admin, is_approved=is_approved)
+    user.set_password('password')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def approved(user_id):
+    db.session.expire_all()
+    return db.session.get(User, user_id).is_approved
+
+
+def exists(user_id):
+    db.session.expire_all()
+    return db.session.get(User, user_id) is not None
+
+
+with app.app_context():
+    db.create_all()
+
+    print("="*80)
+    print("Testing user approval / rejection endpoints")
+    print("="*80)
+
+    admin_id = add_user('admin@example.com', is_admin=True, is_approved=True)
+    other_admin_id = add_user('admin2@example.com', is_admin=True, is_approved=True)
+    pending_ids = [add_user(f'pending{i}@example.com') for i in range(4)]
+    approved_id = add_user('approved@example.com', is_approved=True)
+    owner_id = add_user('owner@example.com')
+    db.session.add(Company(user_id=owner_id, cif='123', name='Owner SRL'))
+    db.session.commit()
+
+    client = app.test_client(user=db.session.get(User, admin_id))
+
+    # Single approve: the second call reports that nothing changed
+    first = client.post(f'/users/approve/{pending_ids[0]}', headers=JSON_HEADERS).get_json()
+    second = client.post(f'/users/approve/{pending_ids[0]}', headers=JSON_HEADERS).get_json()
+    check("approve: user approved", approved(pending_ids[0]))
+    check("approve: changed on first call", first.get('changed') is True, str(first))
+    check("approve: unchanged on repeat", second.get('changed') is False, str(second))
+
+    # Bulk approve: pending users approved, already approved ones untouched
+    client.post('/users/bulk-approve', data={'user_ids': [pending_ids[1], approved_id, 'junk']})
+    check("bulk approve: pending user approved", approved(pending_ids[1]))
+    check("bulk approve: others untouched", not approved(pending_ids[2]) and approved(approved_id))
+
+    # Single reject: admins are refused
+    response = client.post(f'/users/reject/{other_admin_id}', headers=JSON_HEADERS)
+    check("reject: admin refused", response.status_code == 400 and exists(other_admin_id))
+
+    # Bulk reject: plain users go through DELETE ... RETURNING, users owning
+    # companies through the ORM (cascade); admins and the current user stay
+    client.post('/users/bulk-reject', data={
+        'user_ids': [pending_ids[2], pending_ids[3], owner_id, other_admin_id, admin_id]
+    })
+    check("bulk reject: pending users removed", not exists(pending_ids[2]) and not exists(pending_ids[3]))
+    check("bulk reject: company owner removed", not exists(owner_id))
+    check("bulk reject: owner's companies cascaded", Company.query.filter_by(user_id=owner_id).count() == 0)
+    check("bulk reject: admins kept", exists(other_admin_id) and exists(admin_id))
+
+    print("="*80)
+    sys.exit(1 if failed else 0)